@@ -7,11 +7,14 @@ Created on Thu Jun  6 09:58:26 2019
 
 
 
+import multiprocessing
 from pyedna import MainWindow
 
                                                     
 if __name__ == '__main__':
-    
+    # Required for the process pool used to read directories, when frozen
+    # into an executable by pyinstaller (see make.bat)
+    multiprocessing.freeze_support()
     MainWindow()
 
         
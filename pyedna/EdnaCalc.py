@@ -1,16 +1,40 @@
+import concurrent.futures
+import weakref
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from matplotlib.ticker import LogFormatter
 from matplotlib import rcParams as rcp
-import scipy.optimize
-import scipy.stats
 try:
-    from EdnaLookup import ddist
+    from EdnaLookup import t_isf, f_isf, chi2_isf, norm_ppf
+    from EdnaReader import read_data_file, read_data_chunks, read_header, check_negative, FileFollower
+    import EdnaStats
+    import EdnaCensored
+    import EdnaDesignCurves
+    from EdnaStore import DataStore
 except ModuleNotFoundError:
-    from .EdnaLookup import ddist
+    from .EdnaLookup import t_isf, f_isf, chi2_isf, norm_ppf
+    from .EdnaReader import read_data_file, read_data_chunks, read_header, check_negative, FileFollower
+    from . import EdnaStats
+    from . import EdnaCensored
+    from . import EdnaDesignCurves
+    from .EdnaStore import DataStore
     # Messy hack to get around the problem of EdnaCalc possibly being either main or imported
 
+# compare_all() only uses worker processes for at least this many datasets
+MIN_PARALLEL_DATASETS = 2000
+# and works on blocks of about this many pairs at a time, to limit memory use
+PAIRS_PER_BLOCK = 1 << 18
+# bootstrap() draws resamples in batches of about this many points, and uses
+# worker processes for at least this many resamples
+POINTS_PER_BATCH = 1 << 20
+MIN_PARALLEL_RESAMPLES = 100000
+# plot_results places the legend in a fixed corner for more points than this
+MAX_POINTS_LEGEND_BEST = 10000
+# Results of linear_regression for which bootstrap() gives intervals
+BOOTSTRAP_KEYS = ("slope", "intercept", "delta_sigma", "dc_bs540_intercept",
+                  "dc_bs540_delta_sigma", "dc_ec3_intercept", "dc_ec3_delta_sigma")
+
 class EdnaCalc:
     '''
     A calculation library for vrious materials-engineering calculations, specifically
@@ -30,31 +54,44 @@ class EdnaCalc:
     '''
     def __init__(self, parent=None):
         self.parent = parent
-        self.data = [None, None]
-        self.header = [None, None]
-        self.runout = [None, None]
+        self.store = DataStore()    # Any number of datasets, see EdnaStore
         self.user_slope = None      # text3             # This is configured from pyedna.OutputBox
         self.user_thick = None      # text5, ref. thick
         self.user_confidence = None # text8, conf
-        self.merge = False
+        self.merge = False          # True to merge all datasets, or a list of ids to merge
+        self.censored = False       # True to include runouts in the fit, see EdnaCensored
         self.epsilon = 0.05 # denoting 95% confidence level, TODO: configurable
                             # equivalent to "cop" in original?
         # Constants for later comparison
         self.ymin = 1e-10
         self.ymax = 1e10
+        # Cache of linear_regression results, see cache_info()
+        self._results = {}
+        self._results_settings = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Files being followed in live mode, see follow()
+        self.followers = {}
+        # Artists drawn by plot_results, by axes, see update_plot()
+        self._plot_artists = weakref.WeakKeyDictionary()
         
         
     def load_data(self, file_path, data_id, **kwargs):
         '''Read a text file and determine which, if any, are runouts.
         Insert the resulting data into the appropriate place
-        Matching the Python style, we use 0 and 1, rather than 1, 2, to denote 
-        d_id (data id)
+        Matching the Python style, we use 0, 1, 2..., rather than 1, 2, 3..., 
+        to denote d_id (data id)
         
         S is accessed as data[:, 0]
         N as data[:, 1]
         runout is a 1D array giving 1 at any row of data in which the runout
         marker was detected. 
         
+        In streaming mode, the file is read in fixed-size chunks, and only the
+        sufficient statistics (see EdnaStats) are kept. This allows regression
+        on files far larger than memory, but the individual data points are
+        not available afterwards (i.e. for plotting or reports)
+        
         Parameters
         ----------
         file_path : path
@@ -66,16 +103,26 @@ class EdnaCalc:
                 column 1 is cycles
                 Runouts are denominated with a *
         data_id : int
-            ID for the data set. Valid values are 0 or 1. 
+            ID for the data set. Any number of datasets may be loaded. If a
+            dataset with this ID already exists, it is replaced
         kwargs
-            delim: str
+            delimiter: str
                 Data delimiter. Default "," (i.e. comma-separated variable)
-            runout_marker : str
+            runout : str
                 Marker used to denote a row as a Runout. Default "*". Use of a
                 marker that is a valid character in a floating point number 
                 (i.e. -, +, . etc) is not valid
-            header : int
+            header_lines : int
                 Number of lines of header information. Default 2.
+            cache : bool or str
+                Cache the parsed data in a binary sidecar file. Default False
+            stream : bool
+                Use streaming mode. Default False
+            chunk_size : int
+                In streaming mode, the number of bytes read at a time
+            
+            See pyedna.EdnaReader.read_data_file for details of the parsing
+            and caching
         
         Returns
         -------
@@ -85,40 +132,254 @@ class EdnaCalc:
         ------
         ValueError
         '''
-        delim = kwargs.get("delimiter", ",")
         runout_marker = kwargs.get("runout", "*")
-        header_lines = kwargs.get("header_lines", 2)
-        
-        if runout_marker in ("-", "+", "=", ".", ","):
-            raise ValueError(f"A runout marker of '{runout_marker}' is not"\
-                             " valid. Use a character that is not a valid"\
-                             " component of a number.")
-
-        data_str = np.genfromtxt(file_path, delimiter=delim, skip_header=header_lines, usecols=(0,1), dtype=str)
-        data = np.zeros(data_str.shape)
-        runout = np.zeros(np.max(data.shape))
-        for i, val in enumerate(data_str[:,0]):
-            try:
-                data[i,:] = data_str[i,:].astype(np.float)
-                
-            except ValueError:
-                runout[i] = 1
-                data[i,0] = np.float(data_str[i,0][1:])
-                data[i,1] = np.float(data_str[i,1])
-        if (data<0).any():
-            raise ValueError("A negative number was detected. Please check"\
-                    " that you have set the correct runout indicator."\
-                    f" PyEdna currently expects {runout_marker}")
-        # Now get the header information that Numpy skipped
-        with open(file_path) as file:
-            header = []
-            for i in range(header_lines):
-                line_n = file.readline().strip()
-                header.append(line_n)
-        
-        self.data[data_id] = data
-        self.runout[data_id] = runout.astype(bool)
-        self.header[data_id] = header
+        stream = kwargs.get("stream", False)
+        
+        if stream:
+            header = read_header(file_path, **kwargs)
+            moments = np.zeros((2, len(EdnaStats.FIELDS)))
+            for chunk, chunk_runout in read_data_chunks(file_path, **kwargs):
+                check_negative(chunk, runout_marker)
+                moments = EdnaStats.combine(moments, EdnaStats.data_moments(chunk, chunk_runout))
+            self.store.set(data_id, None, None, header, moments)
+            self._invalidate(data_id)
+        else:
+            data, runout, header = read_data_file(file_path, **kwargs)
+            self.set_data(data_id, data, runout, header, runout_marker=runout_marker)
+        return None
+    
+    
+    
+    def set_data(self, data_id, data, runout, header, **kwargs):
+        '''Insert an already-parsed dataset, e.g. from a catalog created by
+        pyedna.EdnaReader.read_directory()
+        
+        Parameters
+        ----------
+        data_id : int
+            ID for the data set
+        data : np.ndarray
+            S is data[:, 0], N is data[:, 1]
+        runout : np.ndarray
+            1D boolean array, True where that row of data is a runout
+        header : list
+            Header lines of the data file
+        kwargs
+            runout_marker : str
+                Only used in the error message if negative values are found
+        
+        Returns
+        -------
+        None
+        
+        Raises
+        ------
+        ValueError
+        '''
+        check_negative(data, kwargs.get("runout_marker", "*"))
+        # The log10 columns are calculated once, here, and reused by every analysis
+        log_data = np.log10(data)
+        moments = EdnaStats.data_moments(data, runout, log_data)
+        self.store.set(data_id, data, runout, header, moments, log_data)
+        self._invalidate(data_id)
+        return None
+    
+    
+    
+    def append_points(self, data_id, data, runout=None, **kwargs):
+        '''Add new test results to a dataset that has already been loaded, 
+        e.g. as specimens are finished on a test rig
+        
+        The moments of the dataset are updated with those of the new points 
+        (EdnaStats.combine, a generalisation of Welford's method), so the cost
+        does not depend on the size of the dataset, and the next 
+        linear_regression (with all of its report statistics) is calculated 
+        directly from the updated moments
+        
+        Parameters
+        ----------
+        data_id : int
+            ID for the data set
+        data : np.ndarray
+            New points, S is data[:, 0], N is data[:, 1]. A single point may
+            be given as (S, N)
+        runout : np.ndarray or bool (optional)
+            True where that row of data is a runout. Default no runouts
+        kwargs
+            runout_marker : str
+                Only used in the error message if negative values are found
+        
+        Returns
+        -------
+        None
+        
+        Raises
+        ------
+        ValueError
+        '''
+        if data_id not in self.store:
+            raise ValueError("A dataset matching id '%s' has not yet been loaded" % data_id)
+        data = np.asarray(data, dtype=np.float64).reshape(-1, 2)
+        if runout is None:
+            runout = np.zeros(data.shape[0], dtype=bool)
+        runout = np.broadcast_to(np.asarray(runout, dtype=bool), data.shape[:1])
+        check_negative(data, kwargs.get("runout_marker", "*"))
+        log_data = np.log10(data)
+        moments = EdnaStats.combine(self.store.moments[data_id], EdnaStats.data_moments(data, runout, log_data))
+        if self.store.is_streamed(data_id):
+            # Only the moments of a streamed dataset are kept
+            self.store.append(data_id, None, None, moments)
+        else:
+            self.store.append(data_id, data, runout, moments, log_data)
+        self._invalidate(data_id)
+        return None
+    
+    
+    
+    def remove_point(self, data_id, index):
+        '''Remove a single point from a dataset, the reverse of append_points
+        
+        The moments of the dataset are updated by removing those of the point 
+        (EdnaStats.subtract), without recalculating them from the rest of the
+        data
+        
+        Parameters
+        ----------
+        data_id : int
+            ID for the data set
+        index : int
+            Row of the dataset to remove, as in get_data(data_id)[1]. Negative
+            values count from the end
+        
+        Returns
+        -------
+        None
+        
+        Raises
+        ------
+        ValueError
+            The dataset was loaded in streaming mode, so the points are unknown
+        IndexError
+        '''
+        if data_id not in self.store:
+            raise ValueError("A dataset matching id '%s' has not yet been loaded" % data_id)
+        if self.store.is_streamed(data_id):
+            raise ValueError("Dataset '%s' was loaded in streaming mode, so"\
+                             " the individual data points are not available" % data_id)
+        s, n, is_runout = self.store.row(data_id, index)
+        point = EdnaStats.moments(np.log10([s]), np.log10([n]))
+        moments = self.store.moments[data_id].copy()
+        moments[int(is_runout)] = EdnaStats.subtract(moments[int(is_runout)], point)
+        self.store.remove_row(data_id, index, moments)
+        self._invalidate(data_id)
+        return None
+    
+    
+    
+    def follow(self, file_path, data_id, **kwargs):
+        '''Load a data file that is still being written, e.g. by a test rig, 
+        and keep following it. Each call to update_followed() then adds any 
+        new rows to the dataset, parsing only the part of the file written 
+        since the last call
+        
+        Parameters
+        ----------
+        file_path : path
+            Path to a data file
+        data_id : int
+            ID for the data set
+        kwargs
+            delimiter, runout, header_lines, encoding : see load_data
+        
+        Returns
+        -------
+        None
+        
+        Raises
+        ------
+        ValueError
+        '''
+        self.followers[data_id] = FileFollower(file_path, **kwargs)
+        try:
+            self.update_followed([data_id])
+        except (OSError, ValueError):
+            del self.followers[data_id]
+            raise
+        return None
+    
+    
+    
+    def unfollow(self, data_id):
+        '''Stop following the file of a dataset. The dataset itself is kept'''
+        self.followers.pop(data_id, None)
+        return None
+    
+    
+    
+    def update_followed(self, data_ids=None):
+        '''Add any new rows of the files being followed to their datasets
+        
+        Parameters
+        ----------
+        data_ids : list (optional)
+            Which datasets to update. Default is all datasets being followed
+        
+        Returns
+        -------
+        updated : list
+            IDs of the datasets that have changed
+        '''
+        if data_ids is None:
+            data_ids = list(self.followers.keys())
+        updated = []
+        for data_id in data_ids:
+            follower = self.followers[data_id]
+            data, runout, reset = follower.read()
+            runout_marker = follower.kwargs.get("runout", "*")
+            if reset:
+                # First read, or the file has been replaced: start again
+                self.set_data(data_id, data, runout, follower.header, runout_marker=runout_marker)
+            elif data.shape[0] > 0:
+                self.append_points(data_id, data, runout, runout_marker=runout_marker)
+            else:
+                continue
+            updated.append(data_id)
+        return updated
+    
+    
+    
+    def datasets(self):
+        '''IDs of all loaded datasets'''
+        return self.store.keys()
+    
+    
+    
+    def cache_info(self):
+        '''Statistics of the cache of linear_regression results
+        
+        Returns
+        -------
+        dict
+            hits, misses, and size (the number of results currently cached)
+        '''
+        return {"hits": self.cache_hits, "misses": self.cache_misses,
+                "size": len(self._results)}
+    
+    
+    
+    def clear_cache(self):
+        '''Empty the cache of linear_regression results, and reset the counters'''
+        self._results.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        return None
+    
+    
+    
+    def _invalidate(self, data_id):
+        '''Drop any cached results that depend on the given dataset'''
+        self._results = {key: value for key, value in self._results.items()
+                         if data_id not in [idx for idx, _ in key[0]]}
         return None
 
 
@@ -127,11 +388,16 @@ class EdnaCalc:
         '''A single function for handling selection of data, merging/unmerging,
         handling runouts
         
+        The data is not copied: selecting a single dataset, or datasets that 
+        are adjacent in storage, returns views of the store, and other merged
+        selections are cached until the data changes. The returned arrays
+        are therefore read-only: copy them to modify them
+        
         Parameters
         ----------
-        data_id : int (optional)
-            Which dataset to select. If the Merge=True flag is set, this 
-            parameter is ignored
+        data_id : int or list (optional)
+            Which dataset to select. A list of IDs selects those datasets,
+            merged. If the Merge flag is set, this parameter is ignored
         ignore_merge : Boolean
             temporarily ignore the Merge flag, and return exactly the dataset
             requested
@@ -149,24 +415,73 @@ class EdnaCalc:
             1D array as a mask for data. Cell is TRUE where that data point is
             a runout            
         '''
-        ignore_merge = kwargs.get("ignore_merge", False)
-        if type(data_id) == int:
-            if self.data[data_id] is None:
-                raise ValueError("A dataset matching id '%d' has not yet been loaded" % data_id)
-            if self.merge and not ignore_merge:
-                if self.data[0] is None or self.data[1] is None:
-                    raise NotImplementedError("You have attempted to merge datasets without providing a second dataset")
-        if (not self.merge) or (self.merge and ignore_merge):
-            # i.e. use the specifically requested data set
-            data = self.data[data_id]
-            runout = self.runout[data_id]
-        else:
-            #i.e. merge all available datasets:
-            data = np.concatenate(self.data, axis=0)
-            runout = np.concatenate(self.runout, axis=0)
+        selected = self._selected(data_id, kwargs.get("ignore_merge", False))
+        for idx in selected:
+            if self.store.is_streamed(idx):
+                raise ValueError("Dataset '%s' was loaded in streaming mode, so"\
+                                 " the individual data points are not available" % idx)
+        return self.store.select(selected)
+    
+    
+    
+    def get_log_data(self, data_id=0, **kwargs):
+        '''Identical to get_data, but returning log10(S) and log10(N). These
+        are calculated when the data is loaded, so there is no need to 
+        recalculate them for every analysis'''
+        selected = self._selected(data_id, kwargs.get("ignore_merge", False))
+        for idx in selected:
+            if self.store.is_streamed(idx):
+                raise ValueError("Dataset '%s' was loaded in streaming mode, so"\
+                                 " the individual data points are not available" % idx)
+        return self.store.select(selected, log=True)
+    
+    
+    
+    def get_moments(self, data_id=0, **kwargs):
+        '''Equivalent to get_data, but returning the sufficient statistics of
+        the selected data, rather than the data itself. This is available
+        for datasets loaded in streaming mode
+        
+        Parameters
+        ----------
+        data_id : int or list (optional)
+            Which dataset to select. If the Merge flag is set, this 
+            parameter is ignored
+        ignore_merge : Boolean
+            temporarily ignore the Merge flag
             
-        filtered_data = data[np.invert(runout)]
-        return filtered_data, data, runout
+        Returns
+        -------
+        moments : numpy.ndarray
+            Array of shape (2, 6). [0] are the moments of the data with all
+            runouts removed, [1] the moments of the runouts alone
+        '''
+        selected = self._selected(data_id, kwargs.get("ignore_merge", False))
+        moments = self.store.moments[selected[0]]
+        for idx in selected[1:]:
+            moments = EdnaStats.combine(moments, self.store.moments[idx])
+        return moments
+    
+    
+    
+    def _selected(self, data_id, ignore_merge):
+        '''Which dataset(s) are selected by data_id and the merge flag, as a
+        list of IDs. Raise an error if any of them have not been loaded'''
+        if self.merge is not False and not ignore_merge:
+            if self.merge is True:
+                selected = self.store.keys()
+            else:
+                selected = list(self.merge)
+            if len(selected) < 2:
+                raise NotImplementedError("You have attempted to merge datasets without providing a second dataset")
+        elif isinstance(data_id, (list, tuple)):
+            selected = list(data_id)
+        else:
+            selected = [data_id]
+        for idx in selected:
+            if idx not in self.store:
+                raise ValueError("A dataset matching id '%s' has not yet been loaded" % idx)
+        return selected
         
         
     
@@ -206,11 +521,22 @@ class EdnaCalc:
                 it uses curve_fit with one or both parameters constrained such 
                 that pcov is invalid. Need to find a better approach to this
             
+            (2026-10): 
+                All three cases are now solved in closed form from the moments
+                of the data (EdnaStats.fit), including the covariance of alpha 
+                and beta, instead of curve_fit
+                
+                If self.censored is set, the runouts are included in the fit as
+                censored observations, by maximum likelihood (EdnaCensored.fit).
+                This needs the data points, so is not available for datasets 
+                loaded in streaming mode
+            
         
         Parameters
         ----------
-        data_id : int
-            Which data set to perform a linear regression on
+        data_id : int or list
+            Which data set to perform a linear regression on. A list of IDs
+            selects those datasets, merged
         kwargs
             debug : bool
                 Enable or disable debugging output
@@ -218,28 +544,48 @@ class EdnaCalc:
                 Used by the compare() function. The user should never manually configure this value
             comptuer_intercept : float
                 Used by the compare() function. The user should never manually configure this value
-            ignore_merge : float
+            ignore_merge : bool
                 Used by the compare() function to enforce ignoring the merge flag. The user should never manually configure this value
+            confidence : float or list
+                Confidence level(s), e.g. 0.95. Default is 1-self.epsilon. 
+                Given a list of levels, the values that depend on the 
+                confidence level (intercept_conf, slope_conf, 
+                regression_confidence, confidence_given_s, confidence_b, 
+                confidence_c, s_lower, s_upper, c_lower, c_upper and 
+                confidence_interval) are arrays, with one value per level
+        
+        Results are cached, so repeating an analysis of the same data with 
+        the same settings does not repeat the fit. See cache_info()
         
         Returns
         -------
-        results : dict
-            Dictionary of results and associated statistics
+        results : EdnaDesignCurves.ResultsDict
+            Dictionary of results and associated statistics. The design curves
+            of any registered code are available as "dc_<code>_intercept" and
+            "dc_<code>_delta_sigma". Those of EdnaDesignCurves.DEFAULT_CODES
+            are always included, the others are calculated when first used
         '''
         # Handle kwargs
         debug = kwargs.get("debug", False)
         computer_slope = kwargs.get("computer_slope", None) # This is used by self.compare()
         computer_intercept = kwargs.get("computer_intercept", None) # This is used by self.compare()
-        
-        # Define useful constants
-        log10_2e6 = np.log10(2e6) # approx 6.30103
+        epsilon = self._epsilon(kwargs.get("confidence", None))
+        
+        # Changing a setting makes every cached result out of date
+        settings = (self.user_slope, self.user_thick, self.epsilon, self.censored)
+        if settings != self._results_settings:
+            self._results.clear()
+            self._results_settings = settings
+        selected = self._selected(data_id, kwargs.get("ignore_merge", False))
+        cache_key = (tuple((idx, self.store.version[idx]) for idx in selected),
+                     computer_slope, computer_intercept, 
+                     epsilon if np.ndim(epsilon) == 0 else tuple(epsilon))
+        if cache_key in self._results and not debug:
+            self.cache_hits += 1
+            return self._copy_results(self._results[cache_key])
+        self.cache_misses += 1
         
         # Select the correct group of data, handling emrging as required. 
-        data = self.get_data(data_id, **kwargs)[0]
-        if debug:
-            print(data)
-        S = data[:, 0] # Stress
-        N = data[:, 1] # Lifetime
         # Make a substitution to match a simple linear model
         # In this substitution, we want to find alpha = log10(intercept)
         # and beta = gradient
@@ -247,190 +593,743 @@ class EdnaCalc:
         # mapping between  (s <> x) and (N <> y). Beware - this results in 
         # "x" being plotted on the y axis, and vice-versa. THIS IS NOT THE 
         # SAME AS IN EDNA. PAY ATTENTION TO WHICH IS WHICH WITH EXTREME CARE
-        x = np.log10(S)
-        y = np.log10(N)
+        # The regression only needs the moments of x = log10(S) and y = log10(N)
+        # (see EdnaStats), which are calculated when the data is loaded. This
+        # also works for datasets loaded in streaming mode
+        moments = self.get_moments(data_id, **kwargs)[0]
+        if debug:
+            print(moments)
+        
+        fixed_slope, fixed_intercept = self._fixed_parameters(computer_slope, computer_intercept)
+        if self.censored:
+            # The report statistics then describe all of the points
+            log_data, runout = self.get_log_data(data_id, **kwargs)[1:]
+            moments = EdnaStats.combine(*self.get_moments(data_id, **kwargs))
+            fitted = EdnaCensored.fit(log_data[:, 0], log_data[:, 1], runout, 
+                                      [0, runout.size], fixed_slope, fixed_intercept)
+        else:
+            fitted = None
+        table = self._regression_table(moments[np.newaxis], fixed_slope, fixed_intercept, fitted, epsilon)
         
+        # A single dataset is the first (and only) row of the table
+        results = self._table_row(table, 0)
+        
+        # Also write some information about the input data to the results
+        # TODO: Update to account for merged reports. 
+        results["header_1"] = self.store.header[selected[0]][0]
+        results["header_2"] = self.store.header[selected[0]][1]
+        
+        #debugging code
+        if debug:
+            print("Quick results")
+            for key in results.keys():
+                print(f"{key}: {results[key]}")
+        self._results[cache_key] = results
+        return self._copy_results(results)
+    
+    
+    
+    def _table_row(self, table, index):
+        '''The results of a single dataset, i.e. one row of the table given
+        by _regression_table, as plain numbers'''
+        results = {}
+        for key, column in table.items():
+            if key in ("points", "dof"):
+                results[key] = int(column[index])
+            elif key == "covariance" or column.ndim > 1:
+                results[key] = column[index]
+            elif key == "converged":
+                results[key] = bool(column[index])
+            else:
+                results[key] = float(column[index])
+        return EdnaDesignCurves.ResultsDict(results, curve_inputs={
+                key: value[index] for key, value in table.curve_inputs.items()})
+    
+    
+    
+    def _copy_results(self, results):
+        '''Copy a results dict, so that the caller cannot alter the cache'''
+        results = results.copy()
+        for key, value in results.items():
+            if isinstance(value, np.ndarray):
+                results[key] = value.copy()
+        return results
+    
+    
+    
+    def _epsilon(self, confidence):
+        '''Epsilon (e.g. 0.05) for the confidence level(s) given (e.g. 0.95), 
+        or self.epsilon if none are given'''
+        if confidence is None:
+            return self.epsilon
+        if np.ndim(confidence) > 0:
+            return 1 - np.asarray(confidence, dtype=np.float64)
+        return 1 - float(confidence)
+    
+    
+    
+    def batch_regression(self, data, offsets, runout=None, **kwargs):
+        '''Perform the same analysis as linear_regression on many datasets at
+        once. The merge flag does not apply: each segment is analysed alone
+        
+        Parameters
+        ----------
+        data : np.ndarray
+            All of the datasets, concatenated. S is data[:, 0], N is data[:, 1]
+        offsets : np.ndarray
+            Boundaries of the datasets, of length (number of datasets + 1): 
+            dataset i is data[offsets[i]:offsets[i+1]]
+        runout : np.ndarray (optional)
+            1D boolean array, True where that row of data is a runout. Runouts 
+            are excluded from the regression, or, if self.censored is set,
+            included as censored observations, as in linear_regression
+        kwargs
+            computer_slope : float
+            computer_intercept : float
+            confidence : float or list
+                As linear_regression
+        
+        Returns
+        -------
+        table : dict
+            The same statistics as linear_regression (except the headers), 
+            with each value an array holding one row per dataset. With a list
+            of confidence levels, the values that depend on the level have one
+            column per level
+        '''
+        data = np.asarray(data, dtype=np.float64)
+        offsets = np.asarray(offsets, dtype=np.intp)
+        log_data = np.log10(data)
+        fixed_slope, fixed_intercept = self._fixed_parameters(kwargs.get("computer_slope", None), 
+                                                              kwargs.get("computer_intercept", None))
+        epsilon = self._epsilon(kwargs.get("confidence", None))
+        if self.censored:
+            if runout is None:
+                runout = np.zeros(log_data.shape[0], dtype=bool)
+            fitted = EdnaCensored.fit(log_data[:, 0], log_data[:, 1], runout, offsets, 
+                                      fixed_slope, fixed_intercept)
+            moments = EdnaStats.segment_moments(log_data[:, 0], log_data[:, 1], offsets)
+            return self._regression_table(moments, fixed_slope, fixed_intercept, fitted, epsilon)
+        if runout is not None:
+            # Remove the runouts, and shift the offsets to match
+            keep = np.invert(runout)
+            log_data = log_data[keep]
+            offsets = np.concatenate(([0], np.cumsum(keep)))[offsets]
+        moments = EdnaStats.segment_moments(log_data[:, 0], log_data[:, 1], offsets)
+        return self._regression_table(moments, fixed_slope, fixed_intercept, epsilon=epsilon)
+    
+    
+    
+    def influence(self, data_id, **kwargs):
+        '''Leave-one-out influence of each data point on the regression of
+        linear_regression
+
+        Rather than repeating the fit n times, each without one point, the
+        results of leaving out a point are calculated from the fit to all
+        of the points, using the standard identities for the hat matrix
+        H = X (X'X)^-1 X' of a linear model. For point i, with leverage h_i
+        (the diagonal of H) and residual e_i:
+            beta - beta_(i) = (X'X)^-1 x_i e_i / (1 - h_i)
+            (n-p-1) s_(i)^2 = (n-p) s^2 - e_i^2 / (1 - h_i)
+        where p is the number of fitted parameters (the DOF of the fit), and
+        the subscript (i) means "without point i"
+
+        Runouts are excluded from the regression, and therefore have no
+        influence. These identities only hold for the least-squares fit, so
+        censored mode (self.censored) is not supported
+
+        Parameters
+        ----------
+        data_id : int or list
+            As linear_regression
+        kwargs
+            computer_slope : float
+            computer_intercept : float
+            ignore_merge : bool
+                As linear_regression
+
+        Returns
+        -------
+        influence : dict
+            Each value is an array with one entry per failure, in the order of
+            the data (see get_data):
+                index : row of the point in the (merged) data
+                leverage : h_i
+                residual : e_i, in log10(N)
+                studentized_residual : e_i / (s_(i) sqrt(1 - h_i))
+                cooks_distance : Cook's distance D_i
+                slope_change : slope without the point, minus slope
+                intercept_change : intercept without the point, minus intercept
+                delta_sigma_change : delta_sigma without the point, minus delta_sigma
+        
+        Raises
+        ------
+        ValueError
+            If self.censored is set
+        '''
+        if self.censored:
+            raise ValueError("Influence can only be calculated for the least-squares"\
+                             " fit: turn off censored mode (EdnaCalc.censored)")
+        log10_2e6 = np.log10(2e6)
+        filtered_data, data, runout = self.get_log_data(data_id, **kwargs)
+        moments = self.get_moments(data_id, **kwargs)[0]
+        fixed_slope, fixed_intercept = self._fixed_parameters(kwargs.get("computer_slope", None),
+                                                              kwargs.get("computer_intercept", None))
+        fitted = EdnaStats.fit(moments, fixed_slope, fixed_intercept)
+        alpha = float(fitted["alpha"])
+        beta = float(fitted["beta"])
+        dof = fitted["dof"]
+        n = filtered_data.shape[0]
+        x = filtered_data[:, 0]
+        residual = filtered_data[:, 1] - alpha - (beta * x)
+
+        # For the straight line, the leverage and (X'X)^-1 x_i follow from the
+        # moments of x. With the slope fixed, only the mean is fitted; with both
+        # fixed, nothing is, and leaving a point out changes nothing
+        centred = x - moments[EdnaStats.MEAN_X]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if dof == 2:
+                leverage = (1 / n) + (np.square(centred) / moments[EdnaStats.SXX])
+                d_alpha = (1 / n) - (moments[EdnaStats.MEAN_X] * centred / moments[EdnaStats.SXX])
+                d_beta = centred / moments[EdnaStats.SXX]
+            elif dof == 1:
+                leverage = np.full(n, 1 / n)
+                d_alpha = np.full(n, 1 / n)
+                d_beta = np.zeros(n)
+            else:
+                leverage = np.zeros(n)
+                d_alpha = np.zeros(n)
+                d_beta = np.zeros(n)
+            scaled = residual / (1 - leverage)
+            alpha_loo = alpha - (d_alpha * scaled)
+            beta_loo = beta - (d_beta * scaled)
+
+            rss = float(fitted["residual_sum_of_squares"])
+            variance = rss / (n - dof)
+            variance_loo = np.maximum(rss - (residual * scaled), 0) / (n - dof - 1)
+            studentized = residual / np.sqrt(variance_loo * (1 - leverage))
+            if dof > 0:
+                cooks = np.square(residual) * leverage / (dof * variance * np.square(1 - leverage))
+            else:
+                cooks = np.zeros(n)
+            delta_sigma = 10**((alpha - log10_2e6)/-beta)
+            delta_sigma_loo = 10**((alpha_loo - log10_2e6)/-beta_loo)
+
+        return {"index": np.flatnonzero(np.invert(runout)),
+                "leverage": leverage,
+                "residual": residual,
+                "studentized_residual": studentized,
+                "cooks_distance": cooks,
+                "slope_change": beta_loo - beta,
+                "intercept_change": 10**alpha_loo - 10**alpha,
+                "delta_sigma_change": delta_sigma_loo - delta_sigma}
+    
+    
+    
+    def bootstrap(self, data_id, **kwargs):
+        '''Percentile bootstrap confidence intervals for the main results of
+        linear_regression, as an alternative to the normal-theory intervals
+
+        The failures are resampled with replacement, and each resample is
+        analysed exactly as linear_regression would. Resamples are drawn in
+        batches: a batch is a matrix counting how often each point is drawn
+        in each resample, so that the moments of the whole batch are a single
+        matrix product (EdnaStats.weighted_moments). For many resamples, the
+        batches are spread over a pool of processes
+
+        If self.censored is set, all of the points (failures and runouts) are
+        resampled instead, and every resample of a batch is fitted at once by
+        EdnaCensored.fit, as in linear_regression. This is done in this
+        process. Resamples for which the censored fit does not converge (e.g.
+        with too few failures) are ignored
+
+        Every batch has its own random stream, seeded from the seed given, so
+        that the results depend only on the seed, and not on the number of
+        processes
+
+        Parameters
+        ----------
+        data_id : int or list
+            As linear_regression
+        kwargs
+            resamples : int
+                Number of bootstrap resamples. Default 10000
+            seed : int
+                Seed of the random streams. Default None, i.e. not repeatable
+            processes : int
+                Number of worker processes. Default is one per CPU. With 1, or
+                when there are fewer than MIN_PARALLEL_RESAMPLES resamples,
+                everything is calculated in this process
+            ignore_merge : bool
+                As linear_regression
+
+        Returns
+        -------
+        results : dict
+            For each of BOOTSTRAP_KEYS, "<key>_lower" and "<key>_upper" are
+            the two-sided (1-epsilon) percentile interval. Also
+            "resamples" and "confidence_interval"
+        '''
+        resamples = int(kwargs.get("resamples", 10000))
+        seed = kwargs.get("seed", None)
+        processes = kwargs.get("processes", None)
+        filtered_data, data, runout = self.get_log_data(data_id, **kwargs)
+        if filtered_data.shape[0] == 0:
+            raise ValueError("Cannot bootstrap a dataset without any failures")
+        if not self.censored:
+            # Only the failures are fitted, so only they are resampled
+            data = filtered_data
+        x = np.ascontiguousarray(data[:, 0])
+        y = np.ascontiguousarray(data[:, 1])
+        fixed_slope, fixed_intercept = self._fixed_parameters(None, None)
+
+        batch_size = max(1, POINTS_PER_BATCH // x.size)
+        sizes = [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+        seeds = np.random.RandomState(seed).randint(0, 2**31 - 1, size=len(sizes))
+        if self.censored:
+            batches = [self._bootstrap_censored(seed, size, x, y, runout, fixed_slope, fixed_intercept)
+                       for seed, size in zip(seeds, sizes)]
+        elif processes == 1 or resamples < MIN_PARALLEL_RESAMPLES:
+            batches = map(_bootstrap_batch, seeds, sizes, [x]*len(sizes), [y]*len(sizes))
+            batches = self._bootstrap_columns(batches, fixed_slope, fixed_intercept)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+                batches = pool.map(_bootstrap_batch, seeds, sizes, [x]*len(sizes), [y]*len(sizes))
+                batches = self._bootstrap_columns(batches, fixed_slope, fixed_intercept)
+
+        results = {"resamples": resamples, "confidence_interval": 1-self.epsilon}
+        percentiles = (100*self.epsilon/2, 100*(1-self.epsilon/2))
+        for key in BOOTSTRAP_KEYS:
+            values = np.concatenate([batch[key] for batch in batches])
+            # A resample may have all its points at one stress, leaving the
+            # slope undefined: such resamples are ignored
+            with np.errstate(invalid="ignore"):
+                lower, upper = np.nanpercentile(values, percentiles)
+            results[key+"_lower"] = float(lower)
+            results[key+"_upper"] = float(upper)
+        return results
+    
+    
+    
+    def _bootstrap_columns(self, batches, fixed_slope, fixed_intercept):
+        '''Analyse the moments of each batch of resamples as it arrives, and
+        keep only the columns needed by bootstrap()'''
+        columns = []
+        for moments in batches:
+            table = self._regression_table(moments, fixed_slope, fixed_intercept)
+            columns.append({key: table[key] for key in BOOTSTRAP_KEYS})
+        return columns
+    
+    
+    
+    def _bootstrap_censored(self, seed, size, x, y, runout, fixed_slope, fixed_intercept):
+        '''Draw and analyse a batch of resamples of all points with the 
+        censored fit, for bootstrap(), keeping only the columns it needs'''
+        num_points = x.size
+        draws = _bootstrap_draws(seed, size, num_points)
+        fitted = EdnaCensored.fit(x[draws].ravel(), y[draws].ravel(), runout[draws].ravel(),
+                                  np.arange(size+1) * num_points, fixed_slope, fixed_intercept)
+        # The report statistics describe all of the points, as in linear_regression
+        moments = _bootstrap_batch(seed, size, x, y)
+        table = self._regression_table(moments, fixed_slope, fixed_intercept, fitted)
+        failed = np.invert(table["converged"])
+        columns = {}
+        for key in BOOTSTRAP_KEYS:
+            columns[key] = np.where(failed, np.nan, table[key])
+        return columns
+    
+    
+    
+    def slope_sweep(self, data_id, slopes, **kwargs):
+        '''Repeat linear_regression with the slope fixed at each of many
+        values, as if self.user_slope had been set to each in turn
+
+        Every fit with a fixed slope is calculated from the same moments, so
+        all of the slopes are handled together as one array calculation.
+        Runouts are excluded, as in the least-squares fit
+
+        Also given is the profile likelihood of the slope: the log-likelihood
+        of the data when the slope is fixed and the intercept and variance are
+        fitted. This is
+            -(n/2) * (log(2*pi*RSS(slope)/n) + 1)
+        Its maximum is at the least-squares slope, and the likelihood-ratio
+        confidence interval for the slope, where 2*(maximum - profile) is no
+        more than the chi-squared critical value, follows in closed form since
+        RSS(slope) - RSS(optimum) = sxx * (slope - optimum)**2
+
+        Parameters
+        ----------
+        data_id : int or list
+            As linear_regression
+        slopes : np.ndarray
+            Values of the slope, beta, in the same sense as self.user_slope
+        kwargs
+            ignore_merge : bool
+                As linear_regression
+
+        Returns
+        -------
+        results : dict
+            "slope", and for each slope: "intercept", "alpha", "variance",
+            "stdev", "delta_sigma", "dc_bs540_intercept", "dc_bs540_delta_sigma",
+            "dc_ec3_intercept", "dc_ec3_delta_sigma", "log_likelihood"
+            The profile-likelihood optimum: "optimum_slope",
+            "optimum_log_likelihood", and the (1-epsilon) interval
+            "optimum_lower", "optimum_upper"
+        '''
+        slopes = np.atleast_1d(np.asarray(slopes, dtype=np.float64))
+        moments = self.get_moments(data_id, **kwargs)[0]
+        # Every slope is given, as if by the user, whatever self.user_slope is
+        table = self._regression_table(np.broadcast_to(moments, slopes.shape + moments.shape), slopes, user_slope=True)
+        results = {"slope": slopes}
+        for key in ("intercept", "alpha", "variance", "stdev", "delta_sigma",
+                    "dc_bs540_intercept", "dc_bs540_delta_sigma",
+                    "dc_ec3_intercept", "dc_ec3_delta_sigma"):
+            results[key] = table[key]
+
+        n = moments[EdnaStats.N]
+        optimum = EdnaStats.fit(moments)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rss = EdnaStats.residual_sum_of_squares(moments, table["alpha"], slopes)
+            results["log_likelihood"] = -(n/2) * (np.log(2*np.pi*rss/n) + 1)
+            rss_optimum = float(optimum["residual_sum_of_squares"])
+            results["optimum_slope"] = float(optimum["beta"])
+            results["optimum_log_likelihood"] = -(n/2) * (np.log(2*np.pi*rss_optimum/n) + 1)
+            half_width = np.sqrt(rss_optimum * np.expm1(chi2_isf(self.epsilon, 1) / n) / moments[EdnaStats.SXX])
+            results["optimum_lower"] = results["optimum_slope"] - half_width
+            results["optimum_upper"] = results["optimum_slope"] + half_width
+        return results
+    
+    
+    
+    def psn_curve(self, data_id, survival, stress=None, cycles=None, **kwargs):
+        '''Probability-Stress-Life curves: the life N that a new specimen
+        survives with a given probability at a given stress range S, or the
+        stress range S at which it survives N cycles with that probability
+
+        For a new specimen at x = log10(S), log10(N) is predicted as
+        alpha + beta*x, with the prediction variance
+            s^2 + var(alpha) + 2*x*cov(alpha, beta) + x^2 * var(beta)
+        and the quantiles follow from the t distribution with (points - dof)
+        degrees of freedom. This uses the covariance of the fit, and so works
+        for every fit of linear_regression (fixed slope, censored)
+
+        Every combination of survival probability and S (or N) is calculated,
+        as one broadcast array operation. To find S for a given N, the
+        quantile is a quadratic equation in x, which is also solved for every
+        combination at once
+
+        Parameters
+        ----------
+        data_id : int or list
+            As linear_regression
+        survival : np.ndarray
+            Probabilities of survival, e.g. 0.5 for the mean curve, 0.95
+        stress : np.ndarray
+            Stress ranges S, in [MPa], at which to find N
+        cycles : np.ndarray
+            Lives N at which to find S. Exactly one of stress and cycles must
+            be given
+        kwargs
+            Passed to linear_regression
 
+        Returns
+        -------
+        results : dict
+            "survival", "stress", "cycles" : np.ndarray
+                Of shape survival.shape + stress.shape (or cycles.shape):
+                element [i, j] is the combination of survival[i] with
+                stress[j] (or cycles[j])
+            "prediction_stdev" : np.ndarray
+                The standard deviation of the prediction of log10(N), of the
+                same shape
+        '''
+        if (stress is None) == (cycles is None):
+            raise ValueError("Exactly one of stress and cycles must be given")
+        fit = self.linear_regression(data_id, **kwargs)
+        alpha = fit["alpha"]
+        beta = fit["slope"]
+        var_alpha = fit["covariance"][0, 0]
+        cov_alpha_beta = fit["covariance"][0, 1]
+        var_beta = fit["covariance"][1, 1]
+        base_variance = fit["variance"] + var_alpha
+
+        given = np.asarray(stress if cycles is None else cycles, dtype=np.float64)
+        survival = np.asarray(survival, dtype=np.float64)
+        # Quantile of the t distribution for each probability, as an array
+        # that broadcasts against the stresses / lives
+        t = t_isf(survival, fit["points"] - fit["dof"])
+        t = np.reshape(t, survival.shape + (1,)*given.ndim)
+
+        ln10 = np.log(10)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            if cycles is None:
+                x = np.log10(given)
+                # The standard deviation depends only on the stress
+                stdev = np.sqrt(base_variance + (x * ((2 * cov_alpha_beta) + (x * var_beta))))
+                log_n = (alpha + (beta * x)) + (t * stdev)
+                # 10**y, but exp is considerably faster for large arrays
+                cycles = np.exp(log_n * ln10)
+                stress = np.broadcast_to(given, cycles.shape)
+                stdev = np.broadcast_to(stdev, cycles.shape)
+            else:
+                # Solve (d - beta*x)^2 = t^2 * variance(x), d = log10(N) - alpha,
+                # i.e. a*x^2 - 2*h*x + c = 0, with a, h, c from the fit. Where the curve is monotonic 
+                # (a > 0), the root on the side of the mean curve given by t is
+                # the larger root if t and -beta have the same sign. The 
+                # discriminant h^2 - a*c is expanded so that the large terms 
+                # (d*beta)^2 cancel exactly, leaving t^2 * (k0 + d*(k1 + d*var_beta))
+                t2 = t * t
+                a = (beta * beta) - (t2 * var_beta)
+                a = np.where(a > 0, a, np.nan)
+                scale = np.where(t * -beta >= 0, 1.0, -1.0) * np.abs(t) / a
+                k0 = (beta * beta * base_variance) + (t2 * ((cov_alpha_beta * cov_alpha_beta) - (var_beta * base_variance)))
+                k1 = 2 * beta * cov_alpha_beta
+                d = np.log10(given)
+                d -= alpha
+                root = d * var_beta
+                root += k1
+                root *= d
+                root = np.sqrt(np.maximum(root + k0, 0)) * scale
+                x = ((d * beta) + (t2 * cov_alpha_beta)) / a
+                x += root
+                stdev = np.sqrt(base_variance + (x * ((2 * cov_alpha_beta) + (x * var_beta))))
+                stress = np.exp(x * ln10)
+                cycles = np.broadcast_to(given, stress.shape)
+        return {"survival": np.broadcast_to(survival.reshape(t.shape), stress.shape),
+                "stress": stress, "cycles": cycles, "prediction_stdev": stdev}
+    
+    
+    
+    def knee_fit(self, data_id, **kwargs):
+        '''Fit a bilinear S-N curve: separate lines above and below a knee
+        stress, with the knee chosen to minimise the total residual sum of
+        squares. Runouts are excluded, as in linear_regression
+
+        Every possible knee is tried. The failures are sorted by stress once,
+        and the moments of every group of highest stresses, and of every
+        group of lowest stresses, are found at once as cumulative sums
+        (EdnaStats.prefix_moments), so that all knees are scored together
+        instead of repeating the fit for each. Points at the same stress are
+        never separated
+
+        Both slopes are always fitted, regardless of self.user_slope
+
+        Parameters
+        ----------
+        data_id : int or list
+            As linear_regression
+        kwargs
+            min_points : int
+                Minimum number of points on each side of the knee, at least 3
+                (the fewest that leave a degree of freedom for the variance).
+                Default 3
+            ignore_merge : bool
+                As linear_regression
+
+        Returns
+        -------
+        results : dict
+            "knee_stress", "knee_cycles" : float
+                Where the two lines intersect, if that is between the points
+                either side of the knee. Otherwise, midway (in log space)
+                between those points
+            "residual_sum_of_squares" : float
+                Total of both lines
+            "upper", "lower" : EdnaDesignCurves.ResultsDict
+                The results of linear_regression for the points above and
+                below the knee stress
+        '''
+        min_points = int(kwargs.get("min_points", 3))
+        if min_points < 3:
+            raise ValueError("A knee fit needs at least 3 points each side"\
+                             " (min_points=%d)" % min_points)
+        filtered_data = self.get_log_data(data_id, **kwargs)[0]
+        order = np.argsort(-filtered_data[:, 0], kind="mergesort")
+        x = filtered_data[order, 0]
+        y = filtered_data[order, 1]
+        num_points = x.size
+
+        # upper[k] are the moments of the k+1 highest stresses, lower[k] those
+        # of all of the rest
+        upper = EdnaStats.prefix_moments(x, y)[:-1]
+        lower = EdnaStats.prefix_moments(x[::-1], y[::-1])[-2::-1]
+        split = np.arange(1, num_points)
+        allowed = ((split >= min_points) & (num_points - split >= min_points)
+                   & (x[:-1] != x[1:]))
+        if not allowed.any():
+            raise ValueError("There are too few distinct stress levels to fit a knee"\
+                             " with at least %d points each side" % min_points)
+        rss = (EdnaStats.fit(upper)["residual_sum_of_squares"]
+               + EdnaStats.fit(lower)["residual_sum_of_squares"])
+        best = np.flatnonzero(allowed)[np.argmin(rss[allowed])]
+
+        # Both slopes are fitted, whatever self.user_slope is
+        table = self._regression_table(np.stack([upper[best], lower[best]]), user_slope=False)
+        upper_results = self._table_row(table, 0)
+        lower_results = self._table_row(table, 1)
+
+        # The knee lies between the last point of the upper line and the first
+        # point of the lower line
+        with np.errstate(divide="ignore", invalid="ignore"):
+            knee = ((lower_results["alpha"] - upper_results["alpha"])
+                    / (upper_results["slope"] - lower_results["slope"]))
+        if not x[best+1] <= knee <= x[best]:
+            knee = (x[best] + x[best+1]) / 2
+        log_cycles = ((upper_results["alpha"] + (upper_results["slope"] * knee))
+                      + (lower_results["alpha"] + (lower_results["slope"] * knee))) / 2
+        return {"knee_stress": float(10**knee), "knee_cycles": float(10**log_cycles),
+                "residual_sum_of_squares": float(rss[best]),
+                "upper": upper_results, "lower": lower_results}
+    
+    
+    
+    def _fixed_parameters(self, computer_slope, computer_intercept):
+        '''Which of (slope, log10(intercept)) are fixed rather than fitted, 
+        given the user settings and the parameters given by compare()'''
         ###########################
         #
-        # Provide 3 separate methods for the three cases of Linear Regression
+        # There are 3 separate cases of Linear Regression
         #   a) 2 DOF (i.e. fit both slope and intercept)
         #   b) 1 DOF (i.e. fit intercept, given a defined slope)
         #   c) 0 DOF (i.e. given defined slope and intercept, calculate how good the fit is)
         # Edna does not implement any situation requiring 1DOF but with a defined intercept
-        # 
-        
-        def linear_2dof():
-            '''Implement a linear regression on 2 DOF'''
-            def model(x, alpha, beta):
-                '''Simple linear model'''
-                return alpha + (beta*x)
-            dof = 2
-            (alpha, beta), cov = scipy.optimize.curve_fit(model, x, y)
-            residuals = model(x, alpha, beta) - y
-            
-            # (section 3.3)
-            # Estimate the variance of the observations y_i around the model
-            num_points = y.size
-            residual_sum_of_squares = np.sum(np.square(residuals))
-            total_sum_of_squares = np.sum(np.square(y - np.mean(y)))
-            variance = residual_sum_of_squares / (num_points - dof)
-            stdev = np.sqrt(variance)
-            
-            # Section 3.4
-            # Confidence intervals for alpha, beta
-            r_squared = 1 - ( residual_sum_of_squares / total_sum_of_squares )
-            s95_alpha, s95_beta = scipy.stats.norm.ppf(1-self.epsilon, 0, 1)*np.sqrt(np.diag(cov))
-            return alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares
-
-
-        def linear_1dof(fixed_slope):
-            '''Implement a linear regression on 1DOF, where the curve slope is fixed
-            In this case, alpha is returned as a 1-element numpy array, so need to extract from it'''
-            def model(x, alpha):
-                '''Simple linear model'''
-                return alpha + (fixed_slope*x)
-            dof = 1
-            beta = fixed_slope
-            alpha, cov = scipy.optimize.curve_fit(model, x, y)
-            assert(alpha.size == 1)
-            alpha = alpha[0]
-            residuals = model(x, alpha) - y
-            
-            num_points = y.size
-            residual_sum_of_squares = np.sum(np.square(residuals))
-            total_sum_of_squares = np.sum(np.square(y - np.mean(y)))
-            variance = residual_sum_of_squares / (num_points - dof)
-            stdev = np.sqrt(variance)
-            
-            r_squared = 1 - ( residual_sum_of_squares / total_sum_of_squares )
-            s95_alpha = scipy.stats.norm.ppf(1-self.epsilon, 0, 1)*np.sqrt(cov)
-            s95_beta = 0
-            return alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares
-
-        def linear_0dof(fixed_slope, fixed_intercept):
-            '''Implement a placeholder for a linear regression, where there are
-            no degrees of freedom. This is NOT a linear regression, but provides
-            an equivalent interface for getting the same values out'''
-            def model(x):
-                return fixed_intercept + (fixed_slope*x)
-            dof = 0
-            alpha = fixed_intercept
-            beta = fixed_slope
-            residuals = model(x) - y
-            
-            num_points = y.size
-            residual_sum_of_squares = np.sum(np.square(residuals))
-            total_sum_of_squares = np.sum(np.square(y - np.mean(y)))
-            variance = residual_sum_of_squares / (num_points - dof)
-            stdev = np.sqrt(variance)
-            
-            r_squared = 1 - ( residual_sum_of_squares / total_sum_of_squares )
-            s95_alpha = s95_beta = 0
-            return alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares
-
-        # Perform a simple linear regression to find intercept and gradient
-        # using scipy.optimize.curve_fit.
-        # Work with any constraints provided by redefining the model to catch the correct number of constraints
+        # All three are solved in closed form by EdnaStats.fit
         
         if self.user_slope is not None:
             # User has specified a value for the slope, therefore constrain this from changing
-            alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares = linear_1dof(self.user_slope)
+            fixed_slope, fixed_intercept = self.user_slope, None
         elif computer_slope is not None and computer_intercept is None:
             # Mechanical specified slope parameter, used by self.compare()
-            alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares = linear_1dof(computer_slope)
+            fixed_slope, fixed_intercept = computer_slope, None
         elif computer_slope is not None and computer_intercept is not None:
             # Slope and intercept both specified for self.compare()
-            alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares = linear_0dof(computer_slope, computer_intercept)
+            fixed_slope, fixed_intercept = computer_slope, computer_intercept
         elif self.user_thick is not None:
             # The user has specified a thickness of some sort. 
             # No idea what this means or how it influences things
             raise NotImplementedError
         else:
             # No special parameters defined -> DEFAULT CASE
-            alpha, beta, num_points, dof, r_squared, stdev, variance, s95_alpha, s95_beta, residual_sum_of_squares = linear_2dof()
+            fixed_slope, fixed_intercept = None, None
+        return fixed_slope, fixed_intercept
+    
+    
+    
+    def _regression_table(self, moments, fixed_slope=None, fixed_intercept=None, fitted=None, epsilon=None, user_slope=None):
+        '''Calculate the results of linear_regression for any number of 
+        datasets, given the moments of their failures (shape (k, 6)). Returns
+        a dict of arrays, each with one row per dataset. If the fit has 
+        already been made (see EdnaCensored.fit), it is given as fitted, and
+        moments are those of the points it describes
+        
+        epsilon defaults to self.epsilon. If it is an array of L levels, the 
+        fit is still made once, and the values that depend on epsilon have
+        shape (k, L) instead
+        
+        user_slope is whether the slope is treated as given by the user, which
+        changes the variance used by the report statistics for datasets of 2
+        points or fewer. Defaults to whether self.user_slope is set'''
+        # Define useful constants
+        log10_2e6 = np.log10(2e6) # approx 6.30103
+        if epsilon is None:
+            epsilon = self.epsilon
+        if user_slope is None:
+            user_slope = self.user_slope is not None
+        if np.ndim(epsilon) > 0:
+            # Values per dataset get a new last axis, to broadcast against the levels
+            epsilon = np.asarray(epsilon, dtype=np.float64)
+            per_level = (Ellipsis, np.newaxis)
+        else:
+            per_level = Ellipsis
+        
+        if fitted is None:
+            fitted = EdnaStats.fit(moments, fixed_slope, fixed_intercept)
+        alpha = fitted["alpha"]
+        beta = fitted["beta"]
+        num_points = fitted["points"].astype(int)
+        dof = fitted["dof"]
+        
+        # (section 3.3)
+        # Estimate the variance of the observations y_i around the model
+        residual_sum_of_squares = fitted["residual_sum_of_squares"]
+        variance = fitted["variance"]
+        stdev = np.sqrt(variance)
+        r_squared = fitted["r_squared"]
+        
+        # Section 3.4
+        # Confidence intervals for alpha, beta
+        covariance = np.empty(alpha.shape + (2, 2))
+        covariance[:, 0, 0] = fitted["var_alpha"]
+        covariance[:, 0, 1] = covariance[:, 1, 0] = fitted["cov_alpha_beta"]
+        covariance[:, 1, 1] = fitted["var_beta"]
+        z = norm_ppf(1-epsilon)
+        s95_alpha = z*np.sqrt(fitted["var_alpha"])[per_level]
+        s95_beta = z*np.sqrt(fitted["var_beta"])[per_level]
 
 
-        results = {"r_squared": r_squared, "stdev": stdev, "slope": beta,
-                   "intercept":10**alpha, "delta_sigma": 10**((alpha - log10_2e6)/-beta),
-                   "variance": variance, "points":num_points, "dof": dof, "alpha": alpha,
-                   "intercept_conf": s95_alpha, "slope_conf": s95_beta}
-        # Delta-sigma is in units [Mpa]
-        
-        # Also write some information about the input data to the results
-        # TODO: Update to account for merged reports. 
-        results["header_1"] = self.header[data_id][0]
-        results["header_2"] = self.header[data_id][1]
-        
-        
-        ####################### Report statistics
-        # No-one has been able to provide me with a specification for the following statistics.
-        # Therefore, they are cobbled together as best I can from reverse engineering the original code
-        # In particular, the reversal of x and y relative to mathematical convention (and relative to Edna) 
-        # renders interpretation considerably more difficult and error prone
-        # When, or if, I am able to get a clearer explanation from the users what it all means and why,
-        # it will be tided up
-        #
-        # Until such time, abandon hope all ye who enter, for here be dragons
-        # Simon Ball, Sept 2019
-        
-        
-        #Handled around line 1750 in frmhoved.frm
-        
-        # confidence interval for regression line in Analysis Report
-        mean_logS = np.sum(x)/num_points # YMID
-        mean_logN = np.sum(y)/num_points # XMID
-        sumx = np.sum(x)
-        sumy = np.sum(y)
-        sumx2 = np.sum(x**2)
-        sumy2 = np.sum(y**2)
-        sumxy = np.sum(x*y)
-        sumxx = np.sum( (x-mean_logS)**2 ) # sumyy in frmHoved, around line 1735
-        sumyy = np.sum( (y-mean_logN)**2 )
-        if self.user_slope is not None: # user_slope: text3, Valhel, line 1744
-            S2s = residual_sum_of_squares / (num_points - dof)
-            temp = 1-(residual_sum_of_squares/sumxx) 
-            r = max(0, temp) # Must be positive. 
-        elif self.user_slope is None and num_points > 2: # line 1752
-            S2s = residual_sum_of_squares / (num_points - dof)
-            temp_numerator = (num_points*sumxy) - (sumx*sumy)
-            temp_denominator = np.sqrt( ((num_points * sumy2) - sumy**2) * ((num_points*sumx2) - sumx**2) )
-            temp = temp_numerator / temp_denominator
-            r = max(0, temp)
-        else: # line 1757
-            S2s = 0
-            r = 1
-        s = np.sqrt(S2s)
-        rp = scipy.stats.t.isf(0.05/2, num_points-dof) # Only distinction here seems to be that s95 uses hardcoded confidence, s9xs allows user choice
-        rp2 = scipy.stats.t.isf(self.epsilon/2, num_points-dof) # DivBy2 - original Excel functions are double-sided; scipy are single tailed
-        s9Xs = rp2 * s / np.sqrt(num_points) # I think that in Edna, this is a placeholder for (future) user-defined epsilon
-        s95s = rp * s / np.sqrt(num_points)
-        des3 = s * ddist(num_points-dof) # Used for EC3 design curve
-        rf = scipy.stats.f.isf(self.epsilon, dof, num_points-dof)
-        d0 = 2 * s * np.sqrt(2*rf/num_points) # Used for the confidence interval at the mean value of b/beta
-        d1 = 2 * s * np.sqrt(2*rf / sumxx) # Used for the confidence interval at a mean value of c/alpha
-        pre = 2 * s9Xs * np.sqrt(num_points + 2) ## NOTE the +: this is used in the original code. No idea why. 
-        results["mean_stress"] = 10**mean_logS # In units [MPa]
-        results["regression_confidence"] = 2* s9Xs  # "% confidence interval for Regression Line"
-        results["confidence_given_s"] = pre   # "% confidence interval for given value of S"
-        results["confidence_b"] = d1 # "% confidence interval (for mean value of C)"
-        results["confidence_c"] = d0 # "% confidence interval (for mean value of b)"
-        results["s_lower"] = -beta - (d1*0.5)
-        results["s_upper"] = -beta + (d1*0.5)
-        results["c_lower"] = 10**(alpha-(0.5*d0))
-        results["c_upper"] = 10**(alpha+(0.5*d0))
-        results["dc_bs540_intercept"] = 10**(alpha-(s95s*np.sqrt(num_points+1))) # frmhoved line 426
-        results["dc_bs540_delta_sigma"] = 10**((alpha - log10_2e6 - (s95s*np.sqrt(num_points+1)) )/-beta)
-        results["dc_ec3_intercept"] = 10**(alpha-des3) # frmhoved line 429
-        results["dc_ec3_delta_sigma"] = 10**((alpha - log10_2e6 - des3)/-beta)
-        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            results = {"r_squared": r_squared, "stdev": stdev, "slope": beta,
+                       "intercept":10**alpha, "delta_sigma": 10**((alpha - log10_2e6)/-beta),
+                       "variance": variance, "points":num_points, 
+                       "dof": np.full(num_points.shape, dof), "alpha": alpha,
+                       "intercept_conf": s95_alpha, "slope_conf": s95_beta,
+                       "covariance": covariance}
+            # Delta-sigma is in units [Mpa]
+            
+            
+            ####################### Report statistics
+            # No-one has been able to provide me with a specification for the following statistics.
+            # Therefore, they are cobbled together as best I can from reverse engineering the original code
+            # In particular, the reversal of x and y relative to mathematical convention (and relative to Edna) 
+            # renders interpretation considerably more difficult and error prone
+            # When, or if, I am able to get a clearer explanation from the users what it all means and why,
+            # it will be tided up
+            #
+            # Until such time, abandon hope all ye who enter, for here be dragons
+            # Simon Ball, Sept 2019
+            
+            
+            #Handled around line 1750 in frmhoved.frm
+            
+            # confidence interval for regression line in Analysis Report
+            # All of the sums are calculated from the moments of the data, which
+            # are also available for datasets loaded in streaming mode
+            mean_logS = moments[:, EdnaStats.MEAN_X] # YMID
+            sumxx = moments[:, EdnaStats.SXX] # sumyy in frmHoved, around line 1735
+            # The correlation coefficient r calculated at this point in frmHoved
+            # is not used in any of the results, and is therefore not calculated
+            if user_slope: # user_slope: text3, Valhel, line 1744
+                S2s = residual_sum_of_squares / (num_points - dof)
+            else: # line 1752, 1757
+                S2s = np.where(num_points > 2, residual_sum_of_squares / (num_points - dof), 0)
+            s = np.sqrt(S2s)
+            rp2 = t_isf(epsilon/2, (num_points-dof)[per_level]) # DivBy2 - original Excel functions are double-sided; t_isf is single tailed
+            s9Xs = rp2 * (s / np.sqrt(num_points))[per_level] # I think that in Edna, this is a placeholder for (future) user-defined epsilon
+            rf = f_isf(epsilon, dof, (num_points-dof)[per_level])
+            d0 = 2 * s[per_level] * np.sqrt(2*rf/num_points[per_level]) # Used for the confidence interval at the mean value of b/beta
+            d1 = 2 * s[per_level] * np.sqrt(2*rf / sumxx[per_level]) # Used for the confidence interval at a mean value of c/alpha
+            pre = 2 * s9Xs * np.sqrt(num_points + 2)[per_level] ## NOTE the +: this is used in the original code. No idea why. 
+            results["mean_stress"] = 10**mean_logS # In units [MPa]
+            results["regression_confidence"] = 2* s9Xs  # "% confidence interval for Regression Line"
+            results["confidence_given_s"] = pre   # "% confidence interval for given value of S"
+            results["confidence_b"] = d1 # "% confidence interval (for mean value of C)"
+            results["confidence_c"] = d0 # "% confidence interval (for mean value of b)"
+            results["s_lower"] = -beta[per_level] - (d1*0.5)
+            results["s_upper"] = -beta[per_level] + (d1*0.5)
+            results["c_lower"] = 10**(alpha[per_level]-(0.5*d0))
+            results["c_upper"] = 10**(alpha[per_level]+(0.5*d0))
+            # Design curves (e.g. "dc_bs540_intercept") other than the default
+            # codes are only calculated when asked for, see EdnaDesignCurves
+            results = EdnaDesignCurves.ResultsDict(results, curve_inputs={
+                    "alpha": alpha, "beta": beta, "stdev": s, 
+                    "points": num_points, "dof": np.full(num_points.shape, dof)})
+        
+        if "converged" in fitted:
+            # Whether the censored fit found the maximum likelihood
+            results["converged"] = fitted["converged"]
         # Include the confidence interval used
-        results["confidence_interval"] = 1-self.epsilon # recall that epsilon is, e.g., 0.05 for 95%
-        #debugging code
-        if debug:
-            print("Quick results")
-            for key in results.keys():
-                print(f"{key}: {results[key]}")
+        results["confidence_interval"] = np.full(pre.shape, 1-epsilon) # recall that epsilon is, e.g., 0.05 for 95%
         return results
     
     
@@ -463,16 +1362,12 @@ class EdnaCalc:
         debug = kwargs.get("debug", False)
         
         for idx in [d_id_1, d_id_2]:
-            if self.data[idx] is None:
+            if idx not in self.store:
                 raise ValueError("Cannot compare two datasets because dataset (%s) are not yet loaded" % idx)
         
         results1 = self.linear_regression(d_id_1, ignore_merge=True)
         results2 = self.linear_regression(d_id_2, ignore_merge=True)
-        
-        previous_state = self.merge
-        self.merge = True
-        joint_results = self.linear_regression(-1, ignore_merge=False)
-        self.merge = previous_state
+        joint_results = self.linear_regression([d_id_1, d_id_2], ignore_merge=True)
         
         # TEST 1: test whether the variances can be assumed different or not
         # Section 3.8.1, page 18
@@ -485,8 +1380,8 @@ class EdnaCalc:
         # We REJECT the null hypothesis if either statement is True
         # Therefore, we ACCEPT hypothesis if NOT (either statement is True)
         value_1 = var1/var2
-        test_1_criteria_1 = scipy.stats.f.isf(self.epsilon/2, m_dof1, m_dof2)
-        test_1_criteria_2 = 1/scipy.stats.f.isf(self.epsilon/2, m_dof2, m_dof1)
+        test_1_criteria_1 = f_isf(self.epsilon/2, m_dof1, m_dof2)
+        test_1_criteria_2 = 1/f_isf(self.epsilon/2, m_dof2, m_dof1)
         variances_equal = not ((value_1 > test_1_criteria_1) or \
                                 (value_1 < test_1_criteria_2))
         if debug:
@@ -504,14 +1399,15 @@ class EdnaCalc:
         # TEST 2: test whether SN curves are parallel
         # Section 3.8.2, page 20
         # Compare the individual cases to the joint case, i.e. the slope is the same for both 
-        RSS = self.Q((results1['intercept'], results2['intercept']), (results1['slope'], results2['slope']))
-        RSS_H1 = self.Q((results1['intercept'], results2['intercept']), (joint_results['slope'], joint_results['slope']))
+        d_ids = (d_id_1, d_id_2)
+        RSS = self.Q((results1['intercept'], results2['intercept']), (results1['slope'], results2['slope']), d_ids)
+        RSS_H1 = self.Q((results1['intercept'], results2['intercept']), (joint_results['slope'], joint_results['slope']), d_ids)
         
         # Null hypothesis (1): curves are parallel
         # We REJECT the null hypothesis (1) if the conditional statement is TRUE
         # Therefore, we ACCEPT the null hypothesis (1) if NOT(statement is True)
         value_2 = ((RSS_H1 - RSS)/RSS) * (m_dof1 + m_dof2)
-        test_2_criteria = scipy.stats.f.isf(self.epsilon/2, 1, m_dof1 + m_dof2 -1) 
+        test_2_criteria = f_isf(self.epsilon/2, 1, m_dof1 + m_dof2 -1) 
         curves_parallel = not ( value_2 > test_2_criteria )
         
         if debug:
@@ -531,13 +1427,13 @@ class EdnaCalc:
         # This is not actually a linear regression, because there are no free parameters. 
         temp_results = self.linear_regression(d_id_2, computer_slope=results1['slope'], computer_intercept = np.log10(results1['intercept']), ignore_merge=True)
         m_dof2 = results2['points'] - results2['dof']
-        RSS_H5 = self.Q((results1['intercept'], temp_results['intercept']), (results1['slope'], temp_results['slope']))
+        RSS_H5 = self.Q((results1['intercept'], temp_results['intercept']), (results1['slope'], temp_results['slope']), d_ids)
         
         # Null hypothesis (5): slope and intercepts are equal
         # We REJECT the null hypothesis (5) if the conditional statement is True
         # We ACCEPT the null hypothesis (5) if NOT(statement is True)
         value_4 = ((RSS_H5 - RSS)/RSS) * ((m_dof1 + m_dof2)/2)
-        test_4_criteria = scipy.stats.f.isf(self.epsilon/2, 2, m_dof1+m_dof2)
+        test_4_criteria = f_isf(self.epsilon/2, 2, m_dof1+m_dof2)
         curves_equal = not ( value_4 > test_4_criteria)
         
         if debug:
@@ -558,35 +1454,294 @@ class EdnaCalc:
     
         
     
-    def Q(self, alpha, beta):
+    def compare_all(self, d_ids=None, **kwargs):
+        '''Perform compare() on every pair of datasets at once, to find which
+        of many datasets may be merged
+        
+        Each dataset is fitted only once, and the tests for all pairs are 
+        calculated together from the moments of the datasets. For very many 
+        datasets, blocks of rows are calculated in parallel by a pool of 
+        processes
+        
+        Parameters
+        ----------
+        d_ids : list (optional)
+            Which datasets to compare. Default is all loaded datasets
+        kwargs
+            processes : int
+                Number of worker processes. Default is one per CPU. With 1, or
+                when there are fewer than MIN_PARALLEL_DATASETS datasets, 
+                everything is calculated in this process
+        
+        Returns
+        -------
+        results : dict
+            "ids" : list, the datasets compared
+            "variances_equal" : np.ndarray
+            "curves_parallel" : np.ndarray
+            "curves_equal" : np.ndarray
+                Boolean arrays of shape (N, N): element [i, j] is the result 
+                of compare(ids[i], ids[j]). With no datasets, shape (0, 0)
+        '''
+        processes = kwargs.get("processes", None)
+        keys = ("variances_equal", "curves_parallel", "curves_equal")
+        if d_ids is None:
+            d_ids = self.datasets()
+        d_ids = list(d_ids)
+        if not d_ids:
+            output = {"ids": d_ids}
+            for key in keys:
+                output[key] = np.zeros((0, 0), dtype=bool)
+            return output
+        for idx in d_ids:
+            if idx not in self.store:
+                raise ValueError("Cannot compare datasets because dataset (%s) is not yet loaded" % idx)
+        
+        # compare() uses the same constraints as linear_regression, with 
+        # nothing set by the computer
+        fixed_slope, _ = self._fixed_parameters(None, None)
+        moments = np.array([self.store.moments[idx] for idx in d_ids]).reshape(len(d_ids), 2, -1)
+        failures = moments[:, 0]
+        everything = EdnaStats.combine(moments[:, 0], moments[:, 1])
+        
+        num = len(d_ids)
+        rows_per_block = max(1, PAIRS_PER_BLOCK // max(num, 1))
+        blocks = [np.arange(start, min(start+rows_per_block, num)) 
+                  for start in range(0, num, rows_per_block)]
+        args = (failures, everything, self.epsilon, fixed_slope)
+        if processes == 1 or num < MIN_PARALLEL_DATASETS:
+            results = [_compare_rows(rows, *args) for rows in blocks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(_compare_rows, blocks, *[[arg]*len(blocks) for arg in args]))
+        
+        output = {"ids": d_ids}
+        for k, key in enumerate(keys):
+            output[key] = np.concatenate([result[k] for result in results])
+        return output
+    
+        
+    
+    def pooled_test(self, d_ids=None, **kwargs):
+        '''Test whether k datasets can be pooled, i.e. whether they share a 
+        common slope, and whether they share both slope and intercept. This is 
+        the k-sample form of the tests in Rausand sections 3.8.2 and 3.8.4 
+        (an analysis of covariance), calculated in one pass from the moments 
+        of the datasets. Runouts are excluded, as in linear_regression
+        
+        Unlike compare(), this uses the standard one-sided F tests at 
+        self.epsilon, and ignores any user-specified slope: the question is 
+        what the data supports
+        
+        Parameters
+        ----------
+        d_ids : list (optional)
+            Which datasets to test. Default is all loaded datasets
+        
+        Returns
+        -------
+        results : dict
+            "ids" : the datasets tested
+            "groups" : k
+            "points" : total number of points
+            "variances_equal" : bool, Bartlett's test for equal variances
+            "bartlett", "bartlett_critical" : test statistic, critical value
+            "curves_parallel" : bool, can a common slope be accepted?
+            "f_parallel", "f_parallel_critical"
+            "intercepts_equal" : bool, given a common slope, can a common 
+                intercept be accepted?
+            "f_intercepts", "f_intercepts_critical"
+            "curves_equal" : bool, can a common slope AND intercept be 
+                accepted (against separate lines)?
+            "f_coincident", "f_coincident_critical"
+            "common_slope" : slope of the parallel model
+            "intercepts" : intercept of each dataset in the parallel model
+            "pooled" : results of linear_regression of all datasets merged,
+                with the current settings
+        '''
+        debug = kwargs.get("debug", False)
+        if d_ids is None:
+            d_ids = self.datasets()
+        d_ids = list(d_ids)
+        if len(d_ids) < 2:
+            raise ValueError("At least two datasets are required for a pooled test")
+        for idx in d_ids:
+            if idx not in self.store:
+                raise ValueError("Cannot compare datasets because dataset (%s) is not yet loaded" % idx)
+        moments = np.array([self.store.moments[idx][0] for idx in d_ids])
+        tests = self._pooled_statistics(EdnaStats.group(moments))
+        bartlett, bartlett_critical = tests["bartlett"], tests["bartlett_critical"]
+        f_parallel, f_parallel_critical = tests["f_parallel"], tests["f_parallel_critical"]
+        f_intercepts, f_intercepts_critical = tests["f_intercepts"], tests["f_intercepts_critical"]
+        f_coincident, f_coincident_critical = tests["f_coincident"], tests["f_coincident_critical"]
+        
+        intercepts = 10**(moments[:, EdnaStats.MEAN_Y] - (tests["common_slope"] * moments[:, EdnaStats.MEAN_X]))
+        results = {"ids": d_ids, "groups": len(d_ids), "points": int(np.sum(moments[:, EdnaStats.N])),
+                   "variances_equal": not (bartlett > bartlett_critical),
+                   "bartlett": float(bartlett), "bartlett_critical": float(bartlett_critical),
+                   "curves_parallel": not (f_parallel > f_parallel_critical),
+                   "f_parallel": float(f_parallel), "f_parallel_critical": float(f_parallel_critical),
+                   "intercepts_equal": not (f_intercepts > f_intercepts_critical),
+                   "f_intercepts": float(f_intercepts), "f_intercepts_critical": float(f_intercepts_critical),
+                   "curves_equal": not (f_coincident > f_coincident_critical),
+                   "f_coincident": float(f_coincident), "f_coincident_critical": float(f_coincident_critical),
+                   "common_slope": float(tests["common_slope"]), "intercepts": intercepts,
+                   "pooled": self.linear_regression(d_ids, ignore_merge=True)}
+        if debug:
+            for key in results.keys():
+                print(f"{key}: {results[key]}")
+        return results
+    
+        
+    
+    def find_groups(self, d_ids=None, **kwargs):
+        '''Sort datasets into the largest groups that can each be pooled, i.e.
+        where pooled_test() does not reject equal variances, a common slope, 
+        or a common slope and intercept
+        
+        Groups are built hierarchically: starting with every dataset alone, 
+        the two groups that are most compatible are merged, until no two 
+        groups can be merged. The statistics of each group are updated as it
+        grows (see EdnaStats.merge_groups), so only the candidate merges of 
+        the new group need to be re-tested at each step
+        
+        Parameters
+        ----------
+        d_ids : list (optional)
+            Which datasets to group. Default is all loaded datasets
+        
+        Returns
+        -------
+        groups : list
+            Lists of dataset IDs, largest group first. Any of them may be 
+            used as self.merge. Empty if there are no datasets
+        '''
+        if d_ids is None:
+            d_ids = self.datasets()
+        d_ids = list(d_ids)
+        if not d_ids:
+            return []
+        for idx in d_ids:
+            if idx not in self.store:
+                raise ValueError("Cannot compare datasets because dataset (%s) is not yet loaded" % idx)
+        num = len(d_ids)
+        g = EdnaStats.singletons(np.array([self.store.moments[idx][0] for idx in d_ids]).reshape(num, -1))
+        members = [[idx] for idx in d_ids]
+        active = np.ones(num, dtype=bool)
+        
+        # scores[i, j] is how compatible groups i and j are (lower is better)
+        scores = self._merge_score(g[:, np.newaxis], g[np.newaxis, :])
+        np.fill_diagonal(scores, np.inf)
+        while num > 1:
+            i, j = np.unravel_index(np.argmin(scores), scores.shape)
+            if not scores[i, j] <= 1:
+                break
+            # Merge j into i, and re-test the candidate merges of i
+            g[i] = EdnaStats.merge_groups(g[i], g[j])
+            members[i] += members[j]
+            members[j] = []
+            active[j] = False
+            row = self._merge_score(g[i], g)
+            row[i] = np.inf
+            row[np.invert(active)] = np.inf
+            scores[i, :] = scores[:, i] = row
+            scores[j, :] = scores[:, j] = np.inf
+        return sorted([group for group in members if group], key=len, reverse=True)
+    
+    
+    
+    def _merge_score(self, a, b):
+        '''How compatible the members of groups a and b would be if merged: the 
+        largest ratio of a test statistic of pooled_test() to its critical 
+        value. A merge is acceptable if the score does not exceed 1'''
+        tests = self._pooled_statistics(EdnaStats.merge_groups(a, b))
+        with np.errstate(invalid="ignore"):
+            score = np.maximum.reduce([tests["bartlett"] / tests["bartlett_critical"],
+                                       tests["f_parallel"] / tests["f_parallel_critical"],
+                                       tests["f_coincident"] / tests["f_coincident_critical"]])
+        # Groups that cannot be tested (e.g. too few points) are not merged
+        return np.where(np.isnan(score), np.inf, score)
+    
+    
+    
+    def _pooled_statistics(self, g):
+        '''The test statistics and critical values of pooled_test() for any 
+        number of groups of datasets, given their group statistics (see 
+        EdnaStats.group). Returns a dict of arrays'''
+        fits = EdnaStats.group_fits(g)
+        groups = fits["members"]
+        dof_separate = fits["dof_separate"]
+        dof_parallel = fits["dof_parallel"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Equal variances: Bartlett's test, the k-sample form of test 1 in compare()
+            pooled_variance = fits["rss_separate"] / dof_separate
+            correction = 1 + ((g[..., EdnaStats.INVERSE_DOF] - (1/dof_separate)) / (3 * (groups-1)))
+            bartlett = ((dof_separate * np.log(pooled_variance)) 
+                        - g[..., EdnaStats.DOF_LOG_VARIANCE]) / correction
+            bartlett_critical = chi2_isf(self.epsilon, groups-1)
+            
+            # Common slope: separate lines against parallel lines
+            f_parallel = ((fits["rss_parallel"] - fits["rss_separate"]) / (groups-1)) \
+                            / (fits["rss_separate"] / dof_separate)
+            f_parallel_critical = f_isf(self.epsilon, groups-1, dof_separate)
+            
+            # Common intercept, given a common slope: parallel lines against one line
+            f_intercepts = ((fits["rss_coincident"] - fits["rss_parallel"]) / (groups-1)) \
+                            / (fits["rss_parallel"] / dof_parallel)
+            f_intercepts_critical = f_isf(self.epsilon, groups-1, dof_parallel)
+            
+            # Common slope and intercept: separate lines against one line
+            f_coincident = ((fits["rss_coincident"] - fits["rss_separate"]) / (2*(groups-1))) \
+                            / (fits["rss_separate"] / dof_separate)
+            f_coincident_critical = f_isf(self.epsilon, 2*(groups-1), dof_separate)
+        return {"bartlett": bartlett, "bartlett_critical": bartlett_critical,
+                "f_parallel": f_parallel, "f_parallel_critical": f_parallel_critical,
+                "f_intercepts": f_intercepts, "f_intercepts_critical": f_intercepts_critical,
+                "f_coincident": f_coincident, "f_coincident_critical": f_coincident_critical,
+                "common_slope": fits["common_slope"]}
+    
+        
+    
+    def Q(self, alpha, beta, d_ids=(0, 1)):
         '''Equation 3.32 in Rausand 1981, Used for comparison
         
+        The sum over all points of each dataset (including runouts) is 
+        calculated from the moments of the dataset, without needing the data
+        itself. It therefore takes the same time regardless of the size of the
+        datasets, and also works for datasets loaded in streaming mode
+        
         Parameters
         ----------
         alpha : tuple
-            The intercepts of data set 0 and dataset 1, respectively, calculated from self.linear_regression()
+            The intercepts of the two data sets, respectively, calculated from self.linear_regression()
         beta : tuple
-            The slopes of data set 0 and 1 respectively, calculated from self.linear_regression()
+            The slopes of the two data sets respectively, calculated from self.linear_regression()
+        d_ids : tuple
+            The IDs of the two datasets. Default (0, 1)
         '''
         val = 0
         for k in range(2):
-            y = np.log10(self.data[k])[:,1]
-            x = np.log10(self.data[k])[:,0]
-            val += np.sum(np.square(y - alpha[k] - (beta[k]*x)))
-        return val
+            failures, runouts = self.get_moments(d_ids[k], ignore_merge=True)
+            moments = EdnaStats.combine(failures, runouts)
+            val += EdnaStats.residual_sum_of_squares(moments, alpha[k], beta[k])
+        return float(val)
       
         
         
     def format_analysis(self, d_id, **kwargs):
         '''Produce a formatted string representation of a linear regression
-        of the data set d_id'''
+        of the data set d_id. kwargs are passed to linear_regression, except
+            design_curves : list
+                Codes of the design curves to include, see EdnaDesignCurves.
+                Default EdnaDesignCurves.DEFAULT_CODES'''
+        design_curves = kwargs.pop("design_curves", EdnaDesignCurves.DEFAULT_CODES)
         results = self.linear_regression(d_id, **kwargs)
         rsq = results["r_squared"]
         stdev = results["stdev"]
         slope = results["slope"]
         intercept = results["intercept"]
         ds = results["delta_sigma"]
-        if self.merge:
+        if self.merge is not False or isinstance(d_id, (list, tuple)):
             d_id = "merged"
         else:
             d_id +=1
@@ -596,13 +1751,12 @@ class EdnaCalc:
                 f"Slope:  {slope:3g}",
                 f"Log(10) Intercept:  {np.log10(intercept):3g}",
                 f"Stress Range at N=2e6 (MPa):  {ds:3g}",
-                "",
-                f"Design Curve (BS540)",
-                f"Log(10) Intercept: {np.log10(results['dc_bs540_intercept']):3g}",
-                f"Stress Range at N=2e6 (MPa): {results['dc_bs540_delta_sigma']:3g}",
-                f"Design Curve (EC3)",
-                f"log(10) Intercept: {np.log10(results['dc_ec3_intercept']):3g}",
-                f"Stress Range at N=2e6 (MPa): {results['dc_ec3_delta_sigma']:3g}",)
+                "",)
+        for code in design_curves:
+            name = EdnaDesignCurves.DESIGN_CURVES[code]["name"]
+            outstr += (f"Design Curve ({name})",
+                f"Log(10) Intercept: {np.log10(results[f'dc_{code}_intercept']):3g}",
+                f"Stress Range at N=2e6 (MPa): {results[f'dc_{code}_delta_sigma']:3g}",)
         return outstr
     
     
@@ -652,6 +1806,9 @@ class EdnaCalc:
             Plot the confidence interval of the S-N points or not. Default False
         plot_regression_conf : boolean
             Plot the confidence interval of the regression line or not. Default False
+        design_curves : list
+            Codes of the design curves to plot, see EdnaDesignCurves. Default
+            none
         plot_dc_bs540 : boolean
             Plot the BS540 / NS3472 design curves or not. Default False
         plot_dc_ec3 : boolean
@@ -688,8 +1845,11 @@ class EdnaCalc:
         plot_regression = kwargs.get("plot_regression", True)
         plot_points_conf = kwargs.get("plot_points_conf", False)
         plot_regression_conf = kwargs.get("plot_regression_conf", False)
-        plot_dc_bs540 = kwargs.get("plot_dc_bs540", False)
-        plot_dc_ec3 = kwargs.get("plot_dc_ec3", False)
+        design_curves = list(kwargs.get("design_curves", []))
+        if kwargs.get("plot_dc_bs540", False) and "bs540" not in design_curves:
+            design_curves.append("bs540")
+        if kwargs.get("plot_dc_ec3", False) and "ec3" not in design_curves:
+            design_curves.append("ec3")
         plot_legend=kwargs.get("plot_legend", True)
         font = kwargs.get("font", 12)
         fig = kwargs.get("fig", None)
@@ -761,13 +1921,6 @@ class EdnaCalc:
             n = 10**log_n
             return n, s
         
-        def calculate_curve_by_n(intercept, gradient, n):
-            alpha = np.log10(intercept)
-            log_n = np.log10(n)
-            log_s = (log_n - alpha)/gradient
-            s = 10**log_s
-            return n, s
-        
         ##########################################################
         ############    plot the graph
         # Plotting the base points is deliberately done LAST, because that has a dependence on
@@ -775,10 +1928,14 @@ class EdnaCalc:
                     
         #curve_s = np.array([1*np.min(S), 1*np.max(S)])
         #curve_n, _ = calculate_curve_by_s(results["intercept"], results["slope"], curve_s)
+        # Each line is kept with the result giving its intercept, so that
+        # update_plot() can move it
+        curves = []
         curve_n = np.array([1*np.min(N), 1*np.max(N)])
-        _, curve_s = calculate_curve_by_n(results["intercept"], results["slope"], curve_n)
+        _, curve_s = _curve_by_n(results["intercept"], results["slope"], curve_n)
         if plot_regression:
-            ax.plot(curve_n, curve_s, linestyle=line_style, label="Regression")
+            line, = ax.plot(curve_n, curve_s, linestyle=line_style, label="Regression")
+            curves.append((line, "intercept"))
 
         if plot_points_conf:
             # 95% confidence interval for given value of S
@@ -789,46 +1946,191 @@ class EdnaCalc:
             # Modify the intercept argument given to curve()
             # Second curve is not labelled to avoid duplicating labels in legend
             label = f"{results['confidence_interval']*100:n}% for regression"
-            n1, s1 = calculate_curve_by_n(results["c_upper"], results["slope"], curve_n)
-            n2, s2 = calculate_curve_by_n(results["c_lower"], results["slope"], curve_n)
-            ax.plot(n1, s1, linestyle="--", label=label, color="C4")
-            ax.plot(n2, s2, linestyle="--", color="C4")
-        
-        if plot_dc_bs540:
-            # Plot design curves for BS540, NS3472
-            n, s = calculate_curve_by_n(results["dc_bs540_intercept"], results["slope"], curve_n)
-            ax.plot(n, s, linestyle=line_style, label="BS540, NS3472")
-        
-        if plot_dc_ec3:
-            # Plot design curves for EC3
-            n, s = calculate_curve_by_n(results["dc_ec3_intercept"], results["slope"], curve_n)
-            ax.plot(n, s, linestyle=line_style, label="EC3")
+            n1, s1 = _curve_by_n(results["c_upper"], results["slope"], curve_n)
+            n2, s2 = _curve_by_n(results["c_lower"], results["slope"], curve_n)
+            line_1, = ax.plot(n1, s1, linestyle="--", label=label, color="C4")
+            line_2, = ax.plot(n2, s2, linestyle="--", color="C4")
+            curves += [(line_1, "c_upper"), (line_2, "c_lower")]
+        
+        for code in design_curves:
+            # Plot design curves for each code requested
+            n, s = _curve_by_n(results[f"dc_{code}_intercept"], results["slope"], curve_n)
+            line, = ax.plot(n, s, linestyle=line_style, label=EdnaDesignCurves.DESIGN_CURVES[code]["name"])
+            curves.append((line, f"dc_{code}_intercept"))
             
+        points = None
+        arrows = None
         if plot_points:
             # Main data points
-            ax.scatter(N, S, marker=marker, label="Data")
-            rl = None
-            for i, is_runout in enumerate(runout):
-                if is_runout:
-                    # handle any runout points by plotting an arrow from the marker 
-                    # pointing to top right
-                    # Want these arrows to appear the same regardless of where on the graph they are
-                    # And regardless of whether using a log or linear scale
-                    start_x, start_y = N[i], S[i]                    
-                    len_x = start_x * 0.5
-                    if log_y:
-                        len_y = start_y * 0.1
-                    else:
-                        if rl is None:
-                            rl = ax.get_ylim()[0] * 0.2
-                        len_y = rl
-                    ax.annotate("", xy=(start_x+len_x, start_y+len_y), xytext=(start_x, start_y), arrowprops=dict(arrowstyle="->"))
+            points = ax.scatter(N, S, marker=marker, label="Data")
+            arrows = self._plot_runouts(ax, N[runout], S[runout], log_y)
             
         if plot_legend:
-            ax.legend(fontsize=font)
+            # Finding the "best" place for the legend means checking every 
+            # point, at every redraw
+            loc = "best" if N.size <= MAX_POINTS_LEGEND_BEST else "upper right"
+            ax.legend(fontsize=font, loc=loc)
+        self._plot_artists[ax] = {"data_id": data_id, "log_y": log_y, "curves": curves,
+                                  "points": points, "arrows": arrows}
         
         # For display of the automatic axis limit values:
         # After drawing all relevant lines, get the limits, 
         # and return them to the calling program (probably GraphPlotter)
         actual_limits = *ax.get_xlim(), *ax.get_ylim()
-        return actual_limits
\ No newline at end of file
+        return actual_limits
+    
+    
+    
+    def update_plot(self, ax, data_id=0):
+        '''Update a graph drawn by plot_results with the current data, e.g. in
+        live mode, by changing the data of the points and lines already drawn 
+        rather than drawing the graph again
+        
+        Parameters
+        ----------
+        ax : matplotlib.axes._subplots.AxesSubplot
+            Axes previously given to (or created by) plot_results
+        data_id : int
+            As for plot_results
+        
+        Returns
+        -------
+        list or None
+            Actual axis limits, as for plot_results. None if the axes do not 
+            show a graph of this dataset drawn by plot_results, in which case
+            plot_results should be used
+        '''
+        artists = self._plot_artists.get(ax)
+        if artists is None or artists["data_id"] != data_id:
+            return None
+        data, runout = self.get_data(data_id, ignore_merge=False)[1:]
+        results = self.linear_regression(data_id, ignore_merge=False)
+        S = data[:, 0]
+        N = data[:, 1]
+        curve_n = np.array([np.min(N), np.max(N)])
+        for line, key in artists["curves"]:
+            line.set_data(*_curve_by_n(results[key], results["slope"], curve_n))
+        if artists["points"] is not None:
+            artists["points"].set_offsets(np.column_stack((N, S)))
+            # The number of arrows may have changed: replace them
+            if artists["arrows"] is not None:
+                artists["arrows"].remove()
+            artists["arrows"] = self._plot_runouts(ax, N[runout], S[runout], artists["log_y"])
+            # Let any automatic axis limits include the new points
+            ax.update_datalim(np.column_stack((N, S)))
+            ax.autoscale_view()
+        return (*ax.get_xlim(), *ax.get_ylim())
+    
+    
+    
+    def _plot_runouts(self, ax, N, S, log_y):
+        '''Plot an arrow from each runout pointing to the top right, all in a
+        single call. The arrows appear the same regardless of where on the 
+        graph they are, and regardless of whether using a log or linear scale'''
+        if N.size == 0:
+            return None
+        if log_y:
+            len_y = S * 0.1
+        else:
+            len_y = np.full(S.shape, ax.get_ylim()[0] * 0.2)
+        # With angles and scale_units "xy", each arrow ends exactly at 
+        # (N + U, S + V), even on log axes
+        return ax.quiver(N, S, N * 0.5, len_y, angles="xy", scale_units="xy", scale=1,
+                         units="dots", width=1.2, headwidth=5, headlength=7, headaxislength=6)
+
+
+
+def _curve_by_n(intercept, gradient, n):
+    '''Calculate N, S values to plot the requested curve, for plot_results'''
+    alpha = np.log10(intercept)
+    log_n = np.log10(n)
+    log_s = (log_n - alpha)/gradient
+    s = 10**log_s
+    return n, s
+
+
+
+def _compare_rows(rows, failures, everything, epsilon, fixed_slope):
+    '''The three tests of EdnaCalc.compare() for datasets [rows] against every
+    dataset, for EdnaCalc.compare_all(). This is a module-level function so 
+    that it can be sent to the worker processes
+    
+    Parameters
+    ----------
+    rows : np.ndarray
+        Indices of the first dataset of each pair
+    failures : np.ndarray
+        Moments of the failures of every dataset, shape (N, 6)
+    everything : np.ndarray
+        Moments of all points (including runouts) of every dataset, shape (N, 6)
+    epsilon : float
+        As EdnaCalc.epsilon
+    fixed_slope : float or None
+        The user-specified slope, if any
+    
+    Returns
+    -------
+    variances_equal, curves_parallel, curves_equal : np.ndarray
+        Boolean arrays of shape (len(rows), N)
+    '''
+    fitted = EdnaStats.fit(failures, fixed_slope)
+    alpha = fitted["alpha"]
+    beta = fitted["beta"]
+    variance = fitted["variance"]
+    intercept = 10**alpha
+    m_dof = fitted["points"] - fitted["dof"]
+    # Index arrays so that [first] and [second] broadcast to (len(rows), N)
+    first = rows[:, np.newaxis]
+    second = slice(None)
+    m_dof_sum = m_dof[first] + m_dof[np.newaxis, second]
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # TEST 1: variances equal, see compare()
+        value_1 = variance[first] / variance[np.newaxis, second]
+        test_1_criteria_1 = f_isf(epsilon/2, m_dof[first], m_dof[np.newaxis, second])
+        test_1_criteria_2 = 1/f_isf(epsilon/2, m_dof[np.newaxis, second], m_dof[first])
+        variances_equal = ~((value_1 > test_1_criteria_1) | (value_1 < test_1_criteria_2))
+        
+        # TEST 2: curves parallel. Note that, as in compare(), the intercepts
+        # (10**alpha) are given to Q as alpha
+        rss_self = EdnaStats.residual_sum_of_squares(everything, intercept, beta)
+        RSS = rss_self[first] + rss_self[np.newaxis, second]
+        joint_slope = EdnaStats.fit(EdnaStats.combine(failures[first], failures[np.newaxis, second]), fixed_slope)["beta"]
+        RSS_H1 = (EdnaStats.residual_sum_of_squares(everything[first], intercept[first], joint_slope)
+                  + EdnaStats.residual_sum_of_squares(everything[np.newaxis, second], intercept[np.newaxis, second], joint_slope))
+        value_2 = ((RSS_H1 - RSS)/RSS) * m_dof_sum
+        curves_parallel = ~(value_2 > f_isf(epsilon/2, 1, m_dof_sum - 1))
+        
+        # TEST 3: curves equal. The second dataset is "fitted" with the slope
+        # and intercept of the first, unless the user has fixed the slope, in
+        # which case the fit of the second dataset is unchanged
+        if fixed_slope is None:
+            RSS_H5 = rss_self[first] + EdnaStats.residual_sum_of_squares(everything[np.newaxis, second], intercept[first], beta[first])
+        else:
+            RSS_H5 = RSS
+        value_4 = ((RSS_H5 - RSS)/RSS) * (m_dof_sum/2)
+        curves_equal = ~(value_4 > f_isf(epsilon/2, 2, m_dof_sum))
+    return variances_equal, curves_parallel, curves_equal
+
+
+
+def _bootstrap_draws(seed, size, num_points):
+    '''The indices of the points drawn for each of a batch of bootstrap 
+    resamples, shape (size, num_points)'''
+    return np.random.RandomState(seed).randint(0, num_points, size=(size, num_points))
+
+
+
+def _bootstrap_batch(seed, size, x, y):
+    '''Draw a batch of bootstrap resamples of the points (x, y), for 
+    EdnaCalc.bootstrap(), and return the moments of each resample, shape 
+    (size, 6). This is a module-level function so that it can be sent to the
+    worker processes
+    
+    Each row of the batch is a resample, given as the number of times each
+    point is drawn'''
+    num_points = x.size
+    draws = _bootstrap_draws(seed, size, num_points)
+    draws += np.arange(size)[:, np.newaxis] * num_points
+    counts = np.bincount(draws.ravel(), minlength=size*num_points).reshape(size, num_points)
+    return EdnaStats.weighted_moments(x, y, counts.astype(np.float64))
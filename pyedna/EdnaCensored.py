@@ -0,0 +1,257 @@
+'''
+Maximum-likelihood fit of the log-normal S-N model including runouts
+
+Least squares (EdnaStats.fit) can only use the failures: a runout says that the
+life at that stress is at least N, not that it is N, and discarding the runouts
+makes the curve conservative by an unknown amount. Here, the model
+    y = alpha + beta*x + sigma*z,  z ~ Normal(0, 1)
+is fitted by maximum likelihood, with a failure contributing the normal density
+of its residual, and a runout the probability of surviving at least as long:
+    failure : log L_i = -log(sigma) - z_i**2 / 2 - log(2*pi) / 2
+    runout  : log L_i = log(Phi(-z_i)),    z_i = (y_i - alpha - beta*x_i) / sigma
+
+The likelihood is maximised by Newton's method, with the analytic gradient and
+Hessian with respect to (alpha, beta, log(sigma)), starting from the least-
+squares fit of the failures. Any number of data sets, given as segments of
+concatenated arrays as in EdnaStats.segment_moments, are fitted together:
+every Newton step is one vectorised pass over all of the points, and the small
+linear systems of all of the data sets are solved at once
+'''
+import numpy as np
+import scipy.special
+try:
+    import EdnaStats
+except ModuleNotFoundError:
+    from . import EdnaStats
+
+# Order of the parameters
+ALPHA, BETA, LOG_SIGMA = 0, 1, 2
+
+# Newton iterations stop when no parameter changes by more than TOLERANCE
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 100
+# Maximum number of times a step is halved, if it does not improve the fit
+MAX_HALVINGS = 40
+# Fits where log(sigma) falls below this are abandoned as degenerate
+MIN_LOG_SIGMA = np.log(1e-8)
+
+LOG_SQRT_2PI = 0.5 * np.log(2 * np.pi)
+
+
+
+def fit(x, y, runout, offsets, slope=None, intercept=None):
+    '''Maximum-likelihood fit of y = alpha + beta*x to failures and runouts
+
+    The three cases match EdnaStats.fit: with slope given, only alpha (and
+    sigma) are fitted, and with both slope and intercept given, only sigma
+
+    Parameters
+    ----------
+    x : np.ndarray
+        log10(S) of all data sets, concatenated
+    y : np.ndarray
+        log10(N) of all data sets, concatenated
+    runout : np.ndarray
+        1D boolean array, True where that point is a runout
+    offsets : np.ndarray
+        Boundaries of the data sets, of length (number of data sets + 1):
+        data set i is x[offsets[i]:offsets[i+1]]
+    slope : float, optional
+        Fixed value of beta
+    intercept : float, optional
+        Fixed value of alpha. Only used together with slope
+
+    Returns
+    -------
+    dict
+        The same values as EdnaStats.fit, one per data set, where points
+        counts failures and runouts. The variance and the parameter covariance
+        are the maximum-likelihood estimates scaled by points / (points - dof),
+        so that without runouts the results are exactly the least-squares fit.
+        Also:
+            sigma : the maximum-likelihood estimate of sigma
+            log_likelihood : at the fitted parameters
+            iterations : number of Newton steps taken
+            converged : bool. False where the likelihood has no maximum,
+                e.g. with too few failures, in which case the parameters are
+                the starting values
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    runout = np.asarray(runout, dtype=bool)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    counts = np.diff(offsets)
+    num_sets = counts.size
+    segment = np.repeat(np.arange(num_sets), counts)
+    x = x[offsets[0]:offsets[-1]]
+    y = y[offsets[0]:offsets[-1]]
+    runout = runout[offsets[0]:offsets[-1]]
+    if slope is None:
+        free = [ALPHA, BETA, LOG_SIGMA]
+        dof = 2
+    elif intercept is None:
+        free = [ALPHA, LOG_SIGMA]
+        dof = 1
+    else:
+        free = [LOG_SIGMA]
+        dof = 0
+
+    theta = _start(x, y, runout, offsets, slope, intercept)
+    log_likelihood, gradient, hessian = _derivatives(theta, x, y, runout, segment, num_sets)
+    # With no more failures than fitted line parameters, the line can pass
+    # through every failure, and the likelihood has no maximum
+    failures = np.bincount(segment, weights=np.invert(runout), minlength=num_sets)
+    active = np.all(np.isfinite(theta), axis=1) & (failures > dof)
+    iterations = np.zeros(num_sets, dtype=int)
+    converged = np.zeros(num_sets, dtype=bool)
+    identity = np.eye(len(free))
+    for _ in range(MAX_ITERATIONS):
+        # Only the data sets still being fitted, and their points, take part
+        sets = np.flatnonzero(active)
+        if sets.size == 0:
+            break
+        points = active[segment]
+        arrays = (x[points], y[points], runout[points], segment[points], num_sets)
+
+        # Newton step on the free parameters. Where -H is not positive definite
+        # (far from the optimum), it is shifted until it is, which turns the
+        # step towards the gradient
+        curvature = -hessian[sets][:, free][:, :, free]
+        lowest = np.linalg.eigvalsh(curvature)[:, 0]
+        scale = np.abs(np.diagonal(curvature, axis1=1, axis2=2)).max(axis=1) + 1
+        shift = np.where(lowest > 1e-12 * scale, 0, 1e-6 * scale - lowest)
+        curvature += shift[:, np.newaxis, np.newaxis] * identity
+        step = np.zeros((sets.size, 3))
+        step[:, free] = np.linalg.solve(curvature, gradient[sets][:, free][:, :, np.newaxis])[:, :, 0]
+
+        # Halve the step wherever it makes the fit worse. Close to the optimum,
+        # the change is lost to rounding, which must not count as worse
+        length = np.ones(sets.size)
+        allowance = 1e-12 * (1 + np.abs(log_likelihood[sets]))
+        trial = theta.copy()
+        for _ in range(MAX_HALVINGS):
+            trial[sets] = theta[sets] + (length[:, np.newaxis] * step)
+            trial_likelihood = _log_likelihood(trial, *arrays)[sets]
+            worse = ~(trial_likelihood >= log_likelihood[sets] - allowance)
+            if not worse.any():
+                break
+            length[worse] /= 2
+        theta = trial
+        iterations[sets] += 1
+        new_likelihood, new_gradient, new_hessian = _derivatives(theta, *arrays)
+        log_likelihood[sets] = new_likelihood[sets]
+        gradient[sets] = new_gradient[sets]
+        hessian[sets] = new_hessian[sets]
+        done = np.abs(length[:, np.newaxis] * step).max(axis=1) < TOLERANCE
+        converged[sets[done]] = True
+        active[sets[done]] = False
+        # If the failures lie exactly on a line that the runouts do not
+        # contradict, sigma shrinks towards 0 and there is no maximum
+        active &= theta[:, LOG_SIGMA] > MIN_LOG_SIGMA
+
+    # Covariance of the parameters: the inverse of the observed information
+    information = -hessian[:, free][:, :, free]
+    usable = np.all(np.isfinite(information), axis=(1, 2)) & (np.abs(np.linalg.det(information)) > 0)
+    information[~usable] = identity
+    inverse = np.full(theta.shape + (3,), np.nan)
+    inverse[np.ix_(np.arange(num_sets), free, free)] = np.linalg.inv(information)
+    inverse[~usable] = np.nan
+    if dof < 2:
+        inverse[:, BETA, :] = inverse[:, :, BETA] = 0
+    if dof < 1:
+        inverse[:, ALPHA, :] = inverse[:, :, ALPHA] = 0
+
+    n = counts.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correction = n / (n - dof)
+        sigma = np.exp(theta[:, LOG_SIGMA])
+        variance = sigma * sigma * correction
+        total = EdnaStats.segment_moments(x, y, offsets - offsets[0])[:, EdnaStats.SYY]
+        residual_sum_of_squares = variance * (n - dof)
+        r_squared = 1 - (residual_sum_of_squares / total)
+    return {"alpha": theta[:, ALPHA], "beta": theta[:, BETA], "points": n, "dof": dof,
+            "residual_sum_of_squares": residual_sum_of_squares,
+            "total_sum_of_squares": total, "variance": variance, "r_squared": r_squared,
+            "var_alpha": inverse[:, ALPHA, ALPHA] * correction,
+            "var_beta": inverse[:, BETA, BETA] * correction,
+            "cov_alpha_beta": inverse[:, ALPHA, BETA] * correction,
+            "sigma": sigma, "log_likelihood": log_likelihood,
+            "iterations": iterations, "converged": converged}
+
+
+
+def _start(x, y, runout, offsets, slope, intercept):
+    '''Starting parameters for the Newton iterations: the least-squares fit
+    of the failures, or of all of the points if there are too few failures.
+    Returns an array of shape (number of data sets, 3)'''
+    relative = offsets - offsets[0]
+    failures = np.invert(runout)
+    fail_offsets = np.concatenate(([0], np.cumsum(failures)))[relative]
+    fail_moments = EdnaStats.segment_moments(x[failures], y[failures], fail_offsets)
+    all_moments = EdnaStats.segment_moments(x, y, relative)
+    use_all = fail_moments[:, EdnaStats.N] < 3
+    moments = np.where(use_all[:, np.newaxis], all_moments, fail_moments)
+    fitted = EdnaStats.fit(moments, slope, intercept)
+    theta = np.empty((moments.shape[0], 3))
+    theta[:, ALPHA] = fitted["alpha"]
+    theta[:, BETA] = fitted["beta"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # The variance of the failures alone is too small if the runouts lie
+        # above the line: start no lower than a nominal 0.01 decades
+        theta[:, LOG_SIGMA] = 0.5 * np.log(np.maximum(fitted["variance"], 1e-4))
+    return theta
+
+
+
+def _residuals(theta, x, y, segment):
+    '''Standardised residuals z, and sigma, of every point'''
+    sigma = np.exp(theta[segment, LOG_SIGMA])
+    z = (y - theta[segment, ALPHA] - (theta[segment, BETA] * x)) / sigma
+    return z, sigma
+
+
+
+def _log_likelihood(theta, x, y, runout, segment, num_sets):
+    '''Log-likelihood of each data set'''
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        z, sigma = _residuals(theta, x, y, segment)
+        terms = np.where(runout, scipy.special.log_ndtr(-z),
+                         -np.log(sigma) - (0.5 * z * z) - LOG_SQRT_2PI)
+    likelihood = np.bincount(segment, weights=terms, minlength=num_sets)
+    return np.where(np.isnan(likelihood), -np.inf, likelihood)
+
+
+
+def _derivatives(theta, x, y, runout, segment, num_sets):
+    '''Log-likelihood, gradient (shape (k, 3)) and Hessian (shape (k, 3, 3))
+    of each data set with respect to (alpha, beta, log(sigma))
+
+    With l(z) the log-likelihood of a point as a function of its residual,
+    the derivatives follow from those of z:
+        dz/dalpha = -1/sigma, dz/dbeta = -x/sigma, dz/dlog(sigma) = -z
+    For a failure, l' = -z and l'' = -1. For a runout, with the inverse Mills
+    ratio m = phi(z) / Phi(-z), l' = -m and l'' = -m (m - z)'''
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        z, sigma = _residuals(theta, x, y, segment)
+        log_survival = scipy.special.log_ndtr(-z)
+        mills = np.exp(-(0.5 * z * z) - LOG_SQRT_2PI - log_survival)
+        terms = np.where(runout, log_survival, -np.log(sigma) - (0.5 * z * z) - LOG_SQRT_2PI)
+        first = np.where(runout, -mills, -z)
+        second = np.where(runout, -mills * (mills - z), -1)
+        a = -1 / sigma
+        b = -x / sigma
+        mixed = (second * z) + first       # sigma * d2l / dalpha dlog(sigma)
+        values = [terms,
+                  first * a, first * b, (-first * z) - np.invert(runout),
+                  second * a * a, second * a * b, second * b * b,
+                  mixed / sigma, mixed * x / sigma, (second * z * z) + (first * z)]
+    sums = [np.bincount(segment, weights=value, minlength=num_sets) for value in values]
+    gradient = np.stack(sums[1:4], axis=1)
+    hessian = np.empty((num_sets, 3, 3))
+    hessian[:, ALPHA, ALPHA] = sums[4]
+    hessian[:, ALPHA, BETA] = hessian[:, BETA, ALPHA] = sums[5]
+    hessian[:, BETA, BETA] = sums[6]
+    hessian[:, ALPHA, LOG_SIGMA] = hessian[:, LOG_SIGMA, ALPHA] = sums[7]
+    hessian[:, BETA, LOG_SIGMA] = hessian[:, LOG_SIGMA, BETA] = sums[8]
+    hessian[:, LOG_SIGMA, LOG_SIGMA] = sums[9]
+    return sums[0], gradient, hessian
@@ -0,0 +1,168 @@
+'''
+Design curves given by the various design codes
+
+A design curve is the mean S-N curve of a regression, shifted down to a given
+probability of survival: with the same slope, log10 of the intercept is
+lowered by an offset that depends on the standard deviation of the fit and the
+number of points. Each code is registered in DESIGN_CURVES with a function
+giving that offset, which must work on arrays, so that many datasets are
+handled at once. The confidence level of each code is part of its offset
+function, so it does not depend on the confidence level of the regression.
+
+The results of EdnaCalc.linear_regression are a ResultsDict, holding the
+values "dc_<code>_intercept" and "dc_<code>_delta_sigma". Those of the codes
+in DEFAULT_CODES are calculated with the rest of the results, so that they are
+included when iterating over or saving the results, as they always have been.
+Those of any other code are calculated the first time that either is used, so
+that only the codes asked for are calculated. Further codes can be added with
+register()
+'''
+import numpy as np
+import scipy.special
+try:
+    from EdnaLookup import ddist, t_isf, norm_ppf
+except ModuleNotFoundError:
+    from .EdnaLookup import ddist, t_isf, norm_ppf
+
+# code : {"name": legend label, "description": longer label for selection,
+#         "offset": function(stdev, points, dof) -> offset in log10(N)}
+DESIGN_CURVES = {}
+
+# Codes calculated by default, as before the registry existed
+DEFAULT_CODES = ("bs540", "ec3")
+
+
+
+def register(code, name, description, offset):
+    '''Add a design curve, or replace an existing one
+
+    Parameters
+    ----------
+    code : str
+        Short identifier, used in the result keys "dc_<code>_intercept" and
+        "dc_<code>_delta_sigma". Must not contain "_"
+    name : str
+        Name of the code(s), e.g. for a graph legend
+    description : str
+        Longer description, including the probabilities it is based on
+    offset : function
+        offset(stdev, points, dof), where stdev is the standard deviation of
+        log10(N) about the regression line, points the number of points and
+        dof the number of fitted parameters. Returns the amount by which
+        log10 of the intercept is lowered. Arguments are arrays, broadcast
+        together, and the function should return an array of their shape
+    '''
+    if "_" in code:
+        raise ValueError("Design curve codes may not contain '_' (%s)" % code)
+    DESIGN_CURVES[code] = {"name": name, "description": description, "offset": offset}
+    return None
+
+
+
+def evaluate(code, alpha, beta, stdev, points, dof):
+    '''Calculate the design curve of a code for any number of regressions
+
+    Parameters
+    ----------
+    code : str
+        Key of DESIGN_CURVES
+    alpha, beta : np.ndarray
+        log10(intercept) and slope of the mean curves
+    stdev, points, dof : np.ndarray
+        As the offset functions, see register()
+
+    Returns
+    -------
+    intercept : np.ndarray
+        Intercept of the design curve
+    delta_sigma : np.ndarray
+        Stress range of the design curve at N = 2e6 cycles, in [MPa]
+    '''
+    log10_2e6 = np.log10(2e6)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = DESIGN_CURVES[code]["offset"](stdev, points, dof)
+        intercept = 10**(alpha - offset)
+        delta_sigma = 10**((alpha - log10_2e6 - offset)/-beta)
+    return intercept, delta_sigma
+
+
+
+def tolerance_factor(points, survival, confidence, dof=1):
+    '''One-sided tolerance factor k for a normal sample of the given size:
+    with the given confidence, at least a fraction survival of the population
+    lies above (mean - k * standard deviation). This is a quantile of the
+    noncentral t distribution, with (points - dof) degrees of freedom, where
+    dof is the number of parameters fitted to the sample (1 for the mean)'''
+    root_n = np.sqrt(points)
+    return scipy.special.nctdtrit(points - dof, norm_ppf(survival) * root_n, confidence) / root_n
+
+
+
+class ResultsDict(dict):
+    '''Dict of regression results, in which the design curve values of every
+    code in DESIGN_CURVES are available. Those of DEFAULT_CODES are calculated
+    immediately (unless already given), the rest only when first used, and
+    only then appear in keys(), len() etc.
+
+    curve_inputs holds alpha, beta, stdev, points and dof, as for evaluate()
+    '''
+    def __init__(self, *args, curve_inputs=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.curve_inputs = curve_inputs
+        if curve_inputs is not None:
+            for code in DEFAULT_CODES:
+                self["dc_%s_intercept" % code]
+        return None
+
+    def __missing__(self, key):
+        parts = key.split("_") if isinstance(key, str) else ()
+        if (len(parts) < 3 or parts[0] != "dc" or parts[1] not in DESIGN_CURVES
+                or "_".join(parts[2:]) not in ("intercept", "delta_sigma")
+                or self.curve_inputs is None):
+            raise KeyError(key)
+        intercept, delta_sigma = evaluate(parts[1], **self.curve_inputs)
+        if np.ndim(intercept) == 0:
+            intercept, delta_sigma = float(intercept), float(delta_sigma)
+        self["dc_%s_intercept" % parts[1]] = intercept
+        self["dc_%s_delta_sigma" % parts[1]] = delta_sigma
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def copy(self):
+        return ResultsDict(self, curve_inputs=self.curve_inputs)
+
+
+
+################################################################################
+##########      Registered codes
+
+def _bs540(stdev, points, dof):
+    # frmhoved line 426: 97.5% confidence (two-sided 95% t) of a new observation
+    return t_isf(0.05/2, points-dof) * stdev / np.sqrt(points) * np.sqrt(points+1)
+
+def _ec3(stdev, points, dof):
+    # frmhoved line 429, using the lookup table of the original
+    return stdev * ddist(points-dof)
+
+def _dnv(stdev, points, dof):
+    # DNV-RP-C203: mean minus two standard deviations of log10(N)
+    return 2 * stdev * np.ones(np.shape(points))
+
+def _iiw(stdev, points, dof):
+    # IIW recommendations: 95% survival at 75% confidence (one-sided)
+    return stdev * tolerance_factor(points, 0.95, 0.75, dof)
+
+def _en1999(stdev, points, dof):
+    # EN 1999-1-3 annex D (aluminium): 97.7% survival at 75% confidence
+    return stdev * tolerance_factor(points, 0.977, 0.75, dof)
+
+register("bs540", "BS540, NS3472", "95% Surv, 97.5% Conf (BS540, NS3472)", _bs540)
+register("ec3", "EC3", "95% Surv, 75% Conf (EC3)", _ec3)
+register("dnv", "DNV-RP-C203", "Mean - 2 Std. Dev. (DNV-RP-C203)", _dnv)
+register("iiw", "IIW", "95% Surv, 75% Conf (IIW)", _iiw)
+register("en1999", "EN 1999", "97.7% Surv, 75% Conf (EN 1999)", _en1999)
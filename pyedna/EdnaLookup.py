@@ -4,6 +4,7 @@ No-one has been able to offer an explanation for how the values are calculated,
 and so the full lookup table is recreated here in full
 '''
 import numpy as np
+import scipy.special
 lookup_table_ddist = np.zeros(101)
 lookup_table_ddist[1] = 10.1
 lookup_table_ddist[2] = 4.58
@@ -112,8 +113,80 @@ lookup_table_ddist = lookup_table_ddist[1:]
 # The end result is an array with a length of 100 (i.e. 0-99)
 
 def ddist(n):
+    '''Look up the value for n. n may be an integer, or an array of integers, 
+    in which case an array of values is returned'''
+    if np.ndim(n) > 0:
+        n = np.asarray(n, dtype=int)
+        index = np.minimum(n, lookup_table_ddist.size) - 1
+        return np.where(n > lookup_table_ddist.size, 1.8, lookup_table_ddist[index])
     if n > lookup_table_ddist.size:
         result = 1.8
     else:
         result = lookup_table_ddist[n-1]
-    return result
\ No newline at end of file
+    return result
+
+
+# Quantiles of the t, F, chi-squared and normal distributions, as used for
+# critical values in EdnaCalc. These are equivalent to scipy.stats.t.isf,
+# scipy.stats.f.isf, scipy.stats.chi2.isf and scipy.stats.norm.ppf, but are
+# calculated directly from the scipy.special functions, without the
+# (considerable) overhead of the scipy.stats distribution
+# objects, and without importing scipy.stats at all.
+#
+# Like ddist, each function accepts either numbers, returning a float, or arrays,
+# returning an array. Values for numbers are memoized, since the same few
+# critical values are used over and over again
+_quantiles = {}
+
+def _memoized(function, *args):
+    '''Evaluate function(*args). If all of the args are numbers, the result is
+    remembered for the next call with the same args. If any are arrays, the 
+    function is evaluated once for each distinct combination of args, since 
+    there are typically only a few distinct degrees of freedom'''
+    if any(np.ndim(arg) > 0 for arg in args):
+        args = np.broadcast_arrays(*[np.asarray(arg, dtype=np.float64) for arg in args])
+        # Number the distinct values of each argument, and then the distinct
+        # combinations of those numbers
+        distinct, codes = zip(*[np.unique(arg, return_inverse=True) for arg in args])
+        codes = np.ravel_multi_index([code.ravel() for code in codes], 
+                                     [values.size for values in distinct])
+        combinations, inverse = np.unique(codes, return_inverse=True)
+        indices = np.unravel_index(combinations, [values.size for values in distinct])
+        values = function(*[values[index] for values, index in zip(distinct, indices)])
+        return values[inverse.ravel()].reshape(args[0].shape)
+    key = (function, ) + tuple(float(arg) for arg in args)
+    if key not in _quantiles:
+        _quantiles[key] = float(function(*args))
+    return _quantiles[key]
+
+def _t_isf(q, df):
+    return -scipy.special.stdtrit(df, q)
+
+def _f_isf(q, dfn, dfd):
+    return scipy.special.fdtri(dfn, dfd, 1-q)
+
+def _chi2_isf(q, df):
+    return scipy.special.chdtri(df, q)
+
+def _norm_ppf(p):
+    return scipy.special.ndtri(p)
+
+def t_isf(q, df):
+    '''The value of Student's t distribution with df degrees of freedom that is
+    exceeded with probability q (equivalent to scipy.stats.t.isf)'''
+    return _memoized(_t_isf, q, df)
+
+def f_isf(q, dfn, dfd):
+    '''The value of the F distribution with (dfn, dfd) degrees of freedom that 
+    is exceeded with probability q (equivalent to scipy.stats.f.isf)'''
+    return _memoized(_f_isf, q, dfn, dfd)
+
+def chi2_isf(q, df):
+    '''The value of the chi-squared distribution with df degrees of freedom that
+    is exceeded with probability q (equivalent to scipy.stats.chi2.isf)'''
+    return _memoized(_chi2_isf, q, df)
+
+def norm_ppf(p):
+    '''The value of the standard normal distribution that is not exceeded with
+    probability p (equivalent to scipy.stats.norm.ppf)'''
+    return _memoized(_norm_ppf, p)
@@ -0,0 +1,252 @@
+'''
+Rainflow counting of measured stress (or strain) histories
+
+Turns a load history into the number of cycles of each stress range, which is
+what the S-N curves of EdnaCalc are applied to. Cycles are counted by the
+four-point method of ASTM E1049-85 (2017), section 5.4.4: of four consecutive
+turning points, if the range between the inner two is no greater than either
+of the ranges on the outside, the inner two are a closed cycle, and are
+removed from the history. What cannot be counted this way is the residue,
+which is counted as half cycles once the history is complete.
+
+Histories are counted a chunk at a time, so that histories too large for the
+memory (e.g. 10^8 samples in a np.memmap) can be counted: only the residue
+is kept from one chunk to the next. Within a chunk, the turning points are
+found by array operations, and most cycles are removed by array operations as
+well: every set of four points that meets the condition at the same time is
+removed at once, which does not change the result, since removing a closed
+cycle never stops another one from closing. Only what is left when that stops
+removing many points at a time is counted one point at a time, with a stack.
+
+The cycles are binned by range and mean, and only the histogram is kept
+'''
+import numpy as np
+
+# Arrays given to RainflowCounter.add() are counted in chunks of this many samples
+CHUNK_SIZE = 1 << 20
+# Cycles are removed by array operations for as long as each pass removes at
+# least this fraction of the remaining turning points
+MIN_REMOVED_FRACTION = 1 / 16
+
+
+
+def turning_points(values):
+    '''The turning points (peaks and valleys) of a history, including the first
+    and last points. Repeated values are treated as a single point
+
+    Parameters
+    ----------
+    values : np.ndarray
+        1D history
+
+    Returns
+    -------
+    np.ndarray
+        The turning points, in order
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if values.size < 2:
+        return values.copy()
+    # Drop repeated values, so that every difference is non-zero
+    changed = np.empty(values.size, dtype=bool)
+    changed[0] = True
+    np.not_equal(values[1:], values[:-1], out=changed[1:])
+    values = values[changed]
+    if values.size < 3:
+        return values
+    rising = values[1:] > values[:-1]
+    keep = np.empty(values.size, dtype=bool)
+    keep[0] = keep[-1] = True
+    np.not_equal(rising[1:], rising[:-1], out=keep[1:-1])
+    return values[keep]
+
+
+
+def four_point(points):
+    '''Count the closed cycles in a sequence of turning points by the
+    four-point method
+
+    Parameters
+    ----------
+    points : np.ndarray
+        1D sequence of turning points, see turning_points()
+
+    Returns
+    -------
+    ranges : np.ndarray
+        Range of each closed cycle
+    means : np.ndarray
+        Mean of each closed cycle
+    residue : np.ndarray
+        The turning points left once no more cycles can be closed
+    '''
+    ranges = []
+    means = []
+    points = np.asarray(points, dtype=np.float64)
+    # Remove every closed cycle at once, for as long as that is worthwhile
+    while points.size >= 4:
+        spans = np.abs(np.diff(points))
+        inner = spans[1:-1]
+        closed = (inner <= spans[:-2]) & (inner <= spans[2:])
+        # Two overlapping cycles can both meet the condition (if their ranges
+        # are equal): only take the first of any such run here
+        closed[1:] &= np.invert(closed[:-1])
+        first = np.flatnonzero(closed) + 1
+        if first.size < MIN_REMOVED_FRACTION * points.size:
+            break
+        ranges.append(inner[closed])
+        means.append((points[first] + points[first+1]) / 2)
+        keep = np.ones(points.size, dtype=bool)
+        keep[first] = False
+        keep[first+1] = False
+        points = points[keep]
+
+    # Count whatever is left one point at a time
+    stack = []
+    stack_ranges = []
+    stack_means = []
+    for point in points.tolist():
+        stack.append(point)
+        while len(stack) >= 4:
+            inner = abs(stack[-2] - stack[-3])
+            if inner <= abs(stack[-3] - stack[-4]) and inner <= abs(stack[-1] - stack[-2]):
+                stack_ranges.append(inner)
+                stack_means.append((stack[-2] + stack[-3]) / 2)
+                del stack[-3:-1]
+            else:
+                break
+    ranges.append(np.array(stack_ranges))
+    means.append(np.array(stack_means))
+    return np.concatenate(ranges), np.concatenate(means), np.array(stack)
+
+
+
+class RainflowCounter(object):
+    '''Rainflow counting of a history given in any number of chunks, into a
+    histogram of cycles by range and mean
+
+    Parameters
+    ----------
+    range_edges : np.ndarray
+        Edges of the bins of cycle range, in increasing order
+    mean_edges : np.ndarray
+        Edges of the bins of cycle mean, in increasing order
+
+    Cycles outside of the edges are counted in the first or last bin
+
+    Examples
+    --------
+    >>> counter = RainflowCounter(np.linspace(0, 200, 41), np.linspace(-100, 100, 21))
+    >>> counter.add(np.load("strain_gauge.npy", mmap_mode="r"))
+    >>> histogram = counter.histogram()
+    '''
+    def __init__(self, range_edges, mean_edges):
+        self.range_edges = np.asarray(range_edges, dtype=np.float64)
+        self.mean_edges = np.asarray(mean_edges, dtype=np.float64)
+        if self.range_edges.size < 2 or self.mean_edges.size < 2:
+            raise ValueError("At least one bin of range and of mean is required")
+        self.cycles = np.zeros((self.range_edges.size-1, self.mean_edges.size-1))
+        self.residue = np.zeros(0)
+        self.samples = 0
+        return None
+
+
+
+    def add(self, values):
+        '''Count the next part of the history. Large arrays, including memory-
+        mapped arrays, are read and counted CHUNK_SIZE samples at a time'''
+        for start in range(0, len(values), CHUNK_SIZE):
+            chunk = np.asarray(values[start:start+CHUNK_SIZE], dtype=np.float64)
+            # The residue ends with the last sample so far, which is only a
+            # turning point if the history now changes direction: finding the
+            # turning points of both together settles that
+            points = turning_points(np.concatenate((self.residue, chunk)))
+            ranges, means, self.residue = four_point(points)
+            self._bin(ranges, means, 1)
+            self.samples += chunk.size
+        return None
+
+
+
+    def histogram(self, **kwargs):
+        '''The counted cycles, binned by range and mean
+
+        Parameters
+        ----------
+        kwargs
+            residue : bool
+                Include the residue as half cycles, as at the end of a
+                history. The residue is kept, so more of the history can still
+                be added afterwards. Default True
+
+        Returns
+        -------
+        results : dict
+            "range_edges", "mean_edges" : np.ndarray
+                As given
+            "cycles" : np.ndarray
+                Number of cycles in each bin, shape (range bins, mean bins)
+            "range", "mean", "count" : np.ndarray
+                The same, compactly: the centre of every bin with any cycles,
+                and its number of cycles
+        '''
+        cycles = self.cycles
+        if kwargs.get("residue", True) and self.residue.size > 1:
+            cycles = cycles.copy()
+            half = np.abs(np.diff(self.residue))
+            centre = (self.residue[1:] + self.residue[:-1]) / 2
+            cycles += self._counts(half, centre, 0.5)
+        range_index, mean_index = np.nonzero(cycles)
+        range_centres = (self.range_edges[1:] + self.range_edges[:-1]) / 2
+        mean_centres = (self.mean_edges[1:] + self.mean_edges[:-1]) / 2
+        return {"range_edges": self.range_edges, "mean_edges": self.mean_edges,
+                "cycles": cycles, "range": range_centres[range_index],
+                "mean": mean_centres[mean_index], "count": cycles[range_index, mean_index]}
+
+
+
+    def _bin(self, ranges, means, weight):
+        '''Add cycles to the histogram'''
+        if ranges.size:
+            self.cycles += self._counts(ranges, means, weight)
+        return None
+
+
+
+    def _counts(self, ranges, means, weight):
+        '''Histogram of the given cycles, each counted as weight cycles'''
+        range_bin = np.clip(np.searchsorted(self.range_edges, ranges, side="right") - 1,
+                            0, self.cycles.shape[0]-1)
+        mean_bin = np.clip(np.searchsorted(self.mean_edges, means, side="right") - 1,
+                           0, self.cycles.shape[1]-1)
+        counts = np.bincount((range_bin * self.cycles.shape[1]) + mean_bin,
+                             minlength=self.cycles.size)
+        return weight * counts.reshape(self.cycles.shape)
+
+
+
+def rainflow(history, range_edges, mean_edges, **kwargs):
+    '''Rainflow count a complete history
+
+    Parameters
+    ----------
+    history : np.ndarray or iterable
+        The history as one array (which may be memory-mapped), or an iterable
+        of consecutive chunks of it
+    range_edges, mean_edges : np.ndarray
+        Edges of the bins, see RainflowCounter
+    kwargs
+        Passed to RainflowCounter.histogram()
+
+    Returns
+    -------
+    results : dict
+        See RainflowCounter.histogram()
+    '''
+    counter = RainflowCounter(range_edges, mean_edges)
+    if isinstance(history, np.ndarray):
+        counter.add(history)
+    else:
+        for chunk in history:
+            counter.add(chunk)
+    return counter.histogram(**kwargs)
@@ -0,0 +1,655 @@
+'''
+Readers for the plain-text S-N data files used by Edna
+
+A data file is a few lines of free-text header, followed by one row per test
+specimen giving (at least) the stress range and the number of cycles. Runouts
+are indicated by a marker character (by default "*") in front of the stress.
+
+Rig exports can run to hundreds of thousands of rows, so the files are parsed
+as raw bytes with Numpy, rather than row-by-row in Python. Optionally, the
+parsed result can be cached in a binary sidecar file next to the data file, so
+that re-opening an unchanged file skips the parsing altogether. A file that is
+still being written can be followed with FileFollower, which only parses the
+rows added since it last looked.
+'''
+import concurrent.futures
+import hashlib
+import json
+import locale
+import os
+import pathlib
+import struct
+import tempfile
+import warnings
+import zipfile
+import numpy as np
+
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+UNDERSCORE = ord("_")
+COMMENT = ord("#")
+SPACE = ord(" ")
+_whitespace = np.zeros(256, dtype=bool)
+_whitespace[list(b" \t\r\n\v\f")] = True
+_digit = np.zeros(256, dtype=bool)
+_digit[list(b"0123456789")] = True
+# A delimiter of several bytes is replaced by one of these, if it does not
+# otherwise appear in the data
+_placeholders = np.array([*range(0x01, 0x09), *range(0x0e, 0x20)])
+
+# Parse cache sidecar files are named, e.g., "specimen.sn.pyedna.npz"
+CACHE_SUFFIX = ".pyedna.npz"
+CACHE_VERSION = 1
+
+# Default size of the blocks read by read_data_chunks, in bytes
+CHUNK_SIZE = 1 << 22
+
+# FileFollower compares this many bytes at the start and end of the part of a
+# file already parsed, to detect a file that has been rewritten in place
+SIGNATURE_SIZE = 4096
+
+# read_directory only starts a process pool for at least this many files
+MIN_PARALLEL_FILES = 8
+
+
+def check_runout_marker(runout_marker):
+    '''Raise a ValueError if the runout marker cannot be distinguished from
+    the numbers in the data file'''
+    if runout_marker in ("-", "+", "=", ".", ","):
+        raise ValueError(f"A runout marker of '{runout_marker}' is not"\
+                         " valid. Use a character that is not a valid"\
+                         " component of a number.")
+    if len(runout_marker) != 1 or runout_marker == "#" or ord(runout_marker) > 127:
+        raise ValueError(f"A runout marker of '{runout_marker}' is not"\
+                         " valid. Use a single ASCII character that is not a"\
+                         " comment marker ('#')")
+    return None
+
+
+
+def check_negative(data, runout_marker="*"):
+    '''Raise a ValueError if there are negative values in the data. These
+    are most likely due to using the wrong runout marker'''
+    if (data<0).any():
+        raise ValueError("A negative number was detected. Please check"\
+                " that you have set the correct runout indicator."\
+                f" PyEdna currently expects {runout_marker}")
+    return None
+
+
+
+def read_data_file(file_path, **kwargs):
+    '''Read an S-N data file in a single pass, returning the data, runouts and
+    header.
+
+    The results are identical to those of reading the file with
+    np.genfromtxt(dtype=str) and converting row by row, but several times
+    faster, and without holding the file in memory as an array of strings.
+
+    Parameters
+    ----------
+    file_path : path
+        Path to a data file.
+        Format (unless overruled in kwargs):
+            2 lines of header
+            Comma separated
+            column 0 is stress
+            column 1 is cycles
+            Runouts are denominated with a *
+    kwargs
+        delimiter : str
+            Data delimiter. Default "," (i.e. comma-separated variable)
+        runout : str
+            Marker used to denote a row as a Runout. Default "*".
+        header_lines : int
+            Number of lines of header information. Default 2.
+        encoding : str
+            Encoding of the header lines. Defaults to the same encoding as
+            used by open()
+        cache : bool or str
+            Use a binary sidecar file to cache the parsed data. Default False
+            If True or "stat", the cache is valid as long as the size and
+            modification time of the data file are unchanged. If "hash", the
+            cache is validated against a hash of the file contents instead.
+            On a cache hit, data and runout are read-only memory-mapped arrays
+
+    Returns
+    -------
+    data : np.ndarray
+        Float array of shape (n, 2). S is data[:, 0], N is data[:, 1]
+    runout : np.ndarray
+        Boolean array of shape (n,), True for rows marked as runouts
+    header : list
+        List of header lines, with surrounding whitespace removed
+
+    Raises
+    ------
+    ValueError
+    '''
+    cache = kwargs.get("cache", False)
+    if cache:
+        key = _cache_key(file_path, **kwargs)
+        cached = read_cache(file_path, key)
+        if cached is not None:
+            return cached
+    with open(file_path, "rb") as file:
+        header = _read_header(file, **kwargs)
+        body = file.read()
+    data, runout = parse_data(body, **kwargs)
+    if cache:
+        write_cache(file_path, key, data, runout, header)
+    return data, runout, header
+
+
+
+def read_directory(folder, **kwargs):
+    '''Read every data file in a directory into a catalog of datasets.
+
+    Files are parsed in parallel with a pool of processes. A file that cannot
+    be read does not stop the rest of the batch: the problem is recorded in
+    the catalog entry for that file instead.
+
+    Parameters
+    ----------
+    folder : path
+        Directory to search. Sub-directories are not searched
+    kwargs
+        suffix : str
+            File extension of data files. Default "sn"
+        processes : int
+            Number of worker processes. Default is one per CPU. With 1, or
+            when there are only a few files, the files are read in this
+            process
+        keep_data : bool
+            Include the data and runout arrays in the catalog. Default True
+        delimiter, runout, header_lines, encoding, cache : see read_data_file()
+
+    Returns
+    -------
+    catalog : list
+        One dict per file, sorted by file name, with the keys
+            "path" : pathlib.Path
+            "name" : str, file name
+            "header" : list of header lines
+            "points" : int, number of data points
+            "runouts" : int, number of runouts
+            "data", "runout" : as from read_data_file()
+            "error" : None, or a description of why the file could not be read
+        Where a file could not be read, header, data and runout are None and
+        points and runouts are 0
+    '''
+    suffix = kwargs.pop("suffix", "sn")
+    processes = kwargs.pop("processes", None)
+    paths = sorted(pathlib.Path(folder).glob(f"*.{suffix}"))
+    if processes == 1 or len(paths) < MIN_PARALLEL_FILES:
+        catalog = [_catalog_entry(path, kwargs) for path in paths]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            chunksize = max(1, len(paths) // (4 * (processes or os.cpu_count() or 1)))
+            catalog = list(pool.map(_catalog_entry, paths, [kwargs]*len(paths), chunksize=chunksize))
+    return catalog
+
+
+
+def _catalog_entry(path, kwargs):
+    '''Read a single file for read_directory(). This has to be a module-level
+    function so that it can be sent to the worker processes'''
+    keep_data = kwargs.get("keep_data", True)
+    entry = {"path": path, "name": path.name, "header": None, "points": 0,
+             "runouts": 0, "data": None, "runout": None, "error": None}
+    try:
+        data, runout, header = read_data_file(path, **kwargs)
+        check_negative(data, kwargs.get("runout", "*"))
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+        return entry
+    entry["header"] = header
+    entry["points"] = runout.size
+    entry["runouts"] = int(np.count_nonzero(runout))
+    if keep_data:
+        entry["data"] = np.asarray(data)
+        entry["runout"] = np.asarray(runout)
+    return entry
+
+
+
+def read_header(file_path, **kwargs):
+    '''Read only the header lines of an S-N data file. kwargs header_lines
+    and encoding are as for read_data_file'''
+    with open(file_path, "rb") as file:
+        header = _read_header(file, **kwargs)
+    return header
+
+
+
+def read_data_chunks(file_path, **kwargs):
+    '''Read an S-N data file in chunks of a fixed size, so that files far
+    larger than the available memory can be processed.
+
+    The header lines are skipped, see read_header(). Every chunk contains only
+    whole rows, so the concatenation of the chunks is identical to the output
+    of read_data_file().
+
+    Parameters
+    ----------
+    file_path : path
+        Path to a data file
+    kwargs
+        chunk_size : int
+            Number of bytes to read at a time. Default 4 MiB. Peak memory use
+            is a small multiple of this, regardless of the size of the file
+        delimiter, runout, header_lines : see read_data_file()
+
+    Yields
+    ------
+    data : np.ndarray
+        Float array of shape (n, 2) of the rows in this chunk
+    runout : np.ndarray
+        Boolean array of shape (n,)
+    '''
+    chunk_size = kwargs.get("chunk_size", CHUNK_SIZE)
+    with open(file_path, "rb") as file:
+        _read_header(file, **kwargs)
+        remainder = b""
+        block = file.read(chunk_size)
+        while block:
+            block = remainder + block
+            # Split after the last complete row, and carry the rest forward
+            cut = _complete_lines(block)
+            remainder = block[cut:]
+            if cut > 0:
+                yield parse_data(block[:cut], **kwargs)
+            block = file.read(chunk_size)
+        if remainder.strip():
+            yield parse_data(remainder, **kwargs)
+    return None
+
+
+
+class FileFollower(object):
+    '''Follow a data file that is still being written, e.g. by a test rig
+
+    Each call to read() parses only the bytes added to the file since the
+    previous call, up to the last complete line. A partly-written final line
+    is left for the next call.
+
+    Parameters
+    ----------
+    file_path : path
+        Path to the data file
+    kwargs
+        delimiter, runout, header_lines, encoding : see read_data_file()
+    '''
+    def __init__(self, file_path, **kwargs):
+        self.file_path = pathlib.Path(file_path)
+        self.kwargs = kwargs
+        self.header = None
+        self.offset = 0         # Bytes of the file parsed so far
+        self._identity = None
+        self._parsed = None     # See _signature()
+        return None
+
+
+
+    def read(self):
+        '''Parse any rows added since the last call
+
+        Returns
+        -------
+        data : np.ndarray
+            The new rows, S is data[:, 0], N is data[:, 1]
+        runout : np.ndarray
+            Runout mask for data
+        reset : bool
+            True if the whole file was read: on the first call, or if the file
+            has been replaced, truncated or rewritten since the last call. Any
+            data from previous calls should then be discarded
+        '''
+        stat = os.stat(self.file_path)
+        identity = (stat.st_dev, stat.st_ino)
+        reset = self.header is None or identity != self._identity or stat.st_size < self.offset
+        with open(self.file_path, "rb") as file:
+            # A file rewritten in place keeps its identity, and may already be
+            # longer than before: check that what was parsed is unchanged
+            if not reset and self._signature(file) != self._parsed:
+                reset = True
+            if not reset and stat.st_size == self.offset:
+                return np.zeros((0, 2)), np.zeros(0, dtype=bool), False
+            if reset:
+                file.seek(0)
+                self.header = _read_header(file, **self.kwargs)
+                self.offset = file.tell()
+                self._identity = identity
+            file.seek(self.offset)
+            body = file.read()
+            body = body[:_complete_lines(body)]
+            self.offset += len(body)
+            self._parsed = self._signature(file)
+        data, runout = parse_data(body, **self.kwargs)
+        return data, runout, reset
+
+
+
+    def _signature(self, file):
+        '''The first and last SIGNATURE_SIZE bytes of the part of the file
+        parsed so far'''
+        file.seek(0)
+        head = file.read(min(self.offset, SIGNATURE_SIZE))
+        file.seek(max(0, self.offset - SIGNATURE_SIZE))
+        return head + file.read(min(self.offset, SIGNATURE_SIZE))
+
+
+
+def _read_header(file, **kwargs):
+    '''Read the header lines from an open (binary) file, leaving the file at
+    the start of the data. As in text mode, lines may end with "\\n", "\\r\\n"
+    or "\\r"'''
+    header_lines = kwargs.get("header_lines", 2)
+    encoding = kwargs.get("encoding", None)
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+    header = []
+    while len(header) < header_lines:
+        lines = file.readline().splitlines(True) or [b""]
+        taken = lines[:header_lines - len(header)]
+        header += [line.decode(encoding).strip() for line in taken]
+        # Return whatever followed a bare "\r" to the data
+        rest = sum(len(line) for line in lines[len(taken):])
+        if rest:
+            file.seek(-rest, os.SEEK_CUR)
+    return header
+
+
+
+def _complete_lines(block):
+    '''Length of block up to the end of its last complete line'''
+    return max(block.rfind(b"\n"), block.rfind(b"\r")) + 1
+
+
+
+def parse_data(body, **kwargs):
+    '''Parse the data section of an S-N file (i.e. without header lines)
+
+    Blank lines are skipped, and anything following a "#" is treated as a
+    comment. Only the first two columns are used.
+
+    Parameters
+    ----------
+    body : bytes
+        Raw contents of the data section
+    kwargs
+        delimiter : str
+            Data delimiter. Default ",". May be more than one character
+        runout : str
+            Runout marker, default "*"
+        encoding : str
+            Encoding of the delimiter in the file. Defaults to the same
+            encoding as used by open()
+
+    As with the text readers of Python and Numpy, lines may end in "\\r"
+    alone, and "_" is accepted between digits (e.g. "2_000_000")
+
+    Returns
+    -------
+    data : np.ndarray
+        Float array of shape (n, 2)
+    runout : np.ndarray
+        Boolean array of shape (n,)
+    '''
+    delim = kwargs.get("delimiter", ",")
+    runout_marker = kwargs.get("runout", "*")
+    check_runout_marker(runout_marker)
+    if delim is not None and delim.strip() != "":
+        encoding = kwargs.get("encoding", None)
+        if encoding is None:
+            encoding = locale.getpreferredencoding(False)
+        delim_bytes = delim.encode(encoding)
+    else:
+        delim_bytes = None
+    if delim_bytes is not None and len(delim_bytes) > 1:
+        # Replace the delimiter with a single byte that is not otherwise used
+        unused = _placeholders[np.bincount(np.frombuffer(body, dtype=np.uint8),
+                                           minlength=256)[_placeholders] == 0]
+        if unused.size == 0:
+            raise ValueError(f"The delimiter '{delim}' could not be handled."\
+                             " Please use a single-character delimiter")
+        body = body.replace(delim_bytes, bytes([unused[0]]))
+        delim_bytes = bytes([unused[0]])
+
+    buf = np.frombuffer(body, dtype=np.uint8).copy()
+    if buf.size == 0:
+        return np.zeros((0, 2)), np.zeros(0, dtype=bool)
+    # Digits may be grouped with "_", as accepted by float(): remove them
+    underscore = np.flatnonzero(buf[1:-1] == UNDERSCORE) + 1
+    if underscore.size:
+        grouping = underscore[_digit[buf[underscore-1]] & _digit[buf[underscore+1]]]
+        buf = np.delete(buf, grouping)
+    # A "\r" that is not part of "\r\n" also ends a line
+    cr_pos = np.flatnonzero(buf == CARRIAGE_RETURN)
+    if cr_pos.size:
+        following = np.append(buf, SPACE)[cr_pos + 1]
+        buf[cr_pos[following != NEWLINE]] = NEWLINE
+    # Only the line ends are stored as positions. Anything stored per-byte is
+    # a boolean mask, so that memory use stays at a small multiple of the
+    # file size
+    line_end = np.flatnonzero(buf == NEWLINE)
+    if line_end.size == 0 or line_end[-1] != buf.size - 1:
+        line_end = np.append(line_end, buf.size)
+
+    # Blank out comments: every byte on a line from the first "#" onwards
+    hash_pos = np.flatnonzero(buf == COMMENT)
+    if hash_pos.size:
+        hash_line = np.searchsorted(line_end, hash_pos)
+        first_hash = np.concatenate(([True], hash_line[1:] != hash_line[:-1]))
+        _blank_ranges(buf, hash_pos[first_hash], line_end[hash_line[first_hash]])
+
+    # Only the first two columns are used: blank out everything after them,
+    # so that further columns (empty fields, free text, stray markers) are
+    # ignored, as by np.genfromtxt(usecols=(0,1))
+    if delim_bytes is not None:
+        delim_pos = np.flatnonzero(buf == delim_bytes[0])
+        delim_line = np.searchsorted(line_end, delim_pos)
+        rank = _rank_in_line(delim_line)
+        second = rank == 1
+        _blank_ranges(buf, delim_pos[second], line_end[delim_line[second]])
+        delim_pos = delim_pos[rank == 0]
+    else:
+        delim_pos = None
+        # Without a delimiter, the columns are the runs of non-whitespace,
+        # not counting runout markers
+        not_blank = ~_whitespace[buf] & (buf != ord(runout_marker))
+        field_start = np.flatnonzero(np.concatenate(([not_blank[0]], not_blank[1:] & ~not_blank[:-1])))
+        field_end = np.flatnonzero(np.concatenate((not_blank[:-1] & ~not_blank[1:], [not_blank[-1]]))) + 1
+        del not_blank
+        field_line = np.searchsorted(line_end, field_start)
+        second = _rank_in_line(field_line) == 1
+        _blank_ranges(buf, field_end[second], line_end[field_line[second]])
+
+    # Blank out runout markers and delimiters, so that all that remains is
+    # the numbers separated by whitespace
+    marker_pos = np.flatnonzero(buf == ord(runout_marker))
+    buf[marker_pos] = SPACE
+    if delim_pos is not None:
+        buf[delim_pos] = SPACE
+
+    # Locate the start of every value, and group them by line
+    not_blank = ~_whitespace[buf]
+    token_start = np.flatnonzero(not_blank[1:] & ~not_blank[:-1]) + 1
+    if not_blank[0]:
+        token_start = np.concatenate(([0], token_start))
+    del not_blank
+    if token_start.size == 0:
+        return np.zeros((0, 2)), np.zeros(0, dtype=bool)
+    token_line = np.searchsorted(line_end, token_start)
+    first_token = np.flatnonzero(np.concatenate(([True], token_line[1:] != token_line[:-1])))
+    data_lines = token_line[first_token]
+    tokens_per_line = np.diff(np.append(first_token, token_start.size))
+
+    # Runouts: the marker must precede the first value on a line, and only
+    # appear once per line
+    marker_line = np.searchsorted(line_end, marker_pos)
+    idx = np.minimum(np.searchsorted(data_lines, marker_line), data_lines.size - 1)
+    valid = ((data_lines[idx] == marker_line)
+             & (marker_pos < token_start[first_token[idx]]))
+    if not valid.all() or np.unique(idx).size != idx.size:
+        raise ValueError(f"The runout marker '{runout_marker}' was found"\
+                         " somewhere other than at the start of a row")
+    runout = np.zeros(data_lines.size, dtype=bool)
+    runout[idx] = True
+
+    # If the delimiter is not whitespace, every line must have the delimiter
+    # between each pair of values, i.e. no empty fields
+    if delim_pos is not None:
+        delims_per_line = np.bincount(np.searchsorted(line_end, delim_pos),
+                                      minlength=line_end.size)[data_lines]
+        malformed = tokens_per_line != delims_per_line + 1
+        if malformed.any() or delims_per_line.sum() != delim_pos.size:
+            raise ValueError("The data contains an empty or malformed value."\
+                             f" Please check that '{delim}' is the correct"\
+                             " delimiter")
+    if (tokens_per_line < 2).any():
+        bad = data_lines[tokens_per_line < 2][0] + 1
+        raise ValueError(f"Data row {bad} has fewer than 2 columns")
+
+    with warnings.catch_warnings():
+        # Depending on the version, Numpy signals unparseable text with either
+        # a DeprecationWarning or a ValueError
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(buf.tobytes(), dtype=np.float64, sep=" ")
+        except (DeprecationWarning, ValueError):
+            values = np.zeros(0)
+    if values.size != 2 * data_lines.size:
+        raise ValueError("The data could not be converted to numbers. Please"\
+                         " check the delimiter and runout marker")
+    data = values.reshape(-1, 2)
+    return data, runout
+
+
+
+def _rank_in_line(line):
+    '''Position of each item among those on the same line, given the
+    (sorted) line number of each item'''
+    first = np.flatnonzero(np.concatenate(([True], line[1:] != line[:-1])))
+    return np.arange(line.size) - np.repeat(first, np.diff(np.append(first, line.size)))
+
+
+
+def _blank_ranges(buf, start, end):
+    '''Overwrite buf[start[i]:end[i]] with spaces, for every i. The ranges
+    must not overlap'''
+    edges = np.zeros(buf.size + 1, dtype=np.int8)
+    edges[start] += 1
+    edges[end] -= 1
+    buf[np.cumsum(edges[:-1], dtype=np.int8) > 0] = SPACE
+    return None
+
+
+
+###############################################################################
+#####################           Parse cache
+###############################################################################
+
+def cache_path(file_path):
+    '''Path of the parse cache sidecar file belonging to a data file'''
+    file_path = pathlib.Path(file_path)
+    return file_path.with_name(file_path.name + CACHE_SUFFIX)
+
+
+
+def _cache_key(file_path, **kwargs):
+    '''Everything that must match for a cached parse to be reused: the
+    parsing options, and either the size and modification time, or a hash, of
+    the data file'''
+    cache = kwargs.get("cache", True)
+    key = {"version": CACHE_VERSION,
+           "delimiter": kwargs.get("delimiter", ","),
+           "runout": kwargs.get("runout", "*"),
+           "header_lines": kwargs.get("header_lines", 2),
+           "encoding": kwargs.get("encoding", None) or locale.getpreferredencoding(False)}
+    stat = os.stat(file_path)
+    key["size"] = stat.st_size
+    if cache == "hash":
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        key["sha1"] = digest.hexdigest()
+    elif cache is True or cache == "stat":
+        key["mtime_ns"] = stat.st_mtime_ns
+    else:
+        raise ValueError(f"Unknown cache validation '{cache}'. Valid values"\
+                         " are True, 'stat' or 'hash'")
+    return key
+
+
+
+def read_cache(file_path, key):
+    '''Read a cached parse of file_path, if there is one matching key.
+
+    The cache is an uncompressed .npz archive, so the data and runout arrays
+    are memory-mapped directly out of the archive rather than read.
+
+    Returns
+    -------
+    (data, runout, header) or None
+        None if there is no valid cache
+    '''
+    path = cache_path(file_path)
+    try:
+        with np.load(path) as archive:
+            meta = json.loads(str(archive["meta"]))
+        if meta["key"] != key:
+            return None
+        arrays = _memmap_npz(path, ("data", "runout"))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+    return arrays["data"], arrays["runout"], meta["header"]
+
+
+
+def write_cache(file_path, key, data, runout, header):
+    '''Write a parse cache for file_path. Failure to write the cache (e.g.
+    because the directory is read-only) is silently ignored'''
+    path = cache_path(file_path)
+    meta = np.array(json.dumps({"key": key, "header": header}))
+    temp_name = None
+    try:
+        # Write to a temporary file first, so that a half-written cache can
+        # never be read
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as file:
+            temp_name = file.name
+            np.savez(file, data=np.ascontiguousarray(data), runout=runout, meta=meta)
+        os.replace(temp_name, path)
+    except OSError:
+        if temp_name is not None and os.path.exists(temp_name):
+            os.remove(temp_name)
+    return None
+
+
+
+def _memmap_npz(path, names):
+    '''Memory-map arrays stored in an uncompressed .npz archive'''
+    readers = {(1, 0): np.lib.format.read_array_header_1_0,
+               (2, 0): np.lib.format.read_array_header_2_0}
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as file:
+        for name in names:
+            info = archive.getinfo(name + ".npy")
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError("Cannot memory-map a compressed archive")
+            # The zip local file header is 30 bytes, followed by the file
+            # name and an extra field, and then the .npy file itself
+            file.seek(info.header_offset)
+            name_length, extra_length = struct.unpack("<HH", file.read(30)[26:30])
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            if version not in readers:
+                raise ValueError(f"Unsupported .npy format version {version}")
+            shape, fortran_order, dtype = readers[version](file)
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", shape=shape,
+                                         offset=file.tell(), order="F" if fortran_order else "C")
+    return arrays
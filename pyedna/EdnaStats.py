@@ -0,0 +1,460 @@
+'''
+Sufficient statistics for the log-normal S-N model
+
+Everything that EdnaCalc.linear_regression needs to know about a data set can
+be calculated from six numbers: the number of points, the means of x=log10(S)
+and y=log10(N), and the sums of squares and products about those means. These
+"moments" can be accumulated a chunk at a time, and two sets of moments can be
+combined without access to the underlying data.
+
+Moments are stored as the last axis of an array, in the order given by FIELDS,
+so that many data sets can be handled at once.
+
+The sums about the mean are used, rather than the plain sums (sum(x), sum(x**2)
+etc), because they are not vulnerable to cancellation when a data set is very
+large. The plain sums are available through power_sums()
+'''
+import numpy as np
+
+FIELDS = ("n", "mean_x", "mean_y", "sxx", "syy", "sxy")
+N, MEAN_X, MEAN_Y, SXX, SYY, SXY = range(len(FIELDS))
+
+# A group of data sets is described by the moments of all of its data, followed
+# by sums over its members, which are needed to test whether the members can be
+# pooled (see group_fits)
+GROUP_FIELDS = FIELDS + ("members", "within_sxx", "within_syy", "within_sxy",
+                         "rss_separate", "dof_log_variance", "inverse_dof")
+(MEMBERS, WITHIN_SXX, WITHIN_SYY, WITHIN_SXY, RSS_SEPARATE, DOF_LOG_VARIANCE,
+ INVERSE_DOF) = range(len(FIELDS), len(GROUP_FIELDS))
+
+
+def moments(x, y):
+    '''Calculate the moments of paired observations x, y
+
+    All of the sums are found in a single pass over the data, as one matrix
+    product of the rows [1, x-x0, y-y0]. Shifting by the first point (x0, y0)
+    keeps the sums small enough that the sums about the mean are not lost to
+    cancellation
+
+    Parameters
+    ----------
+    x : np.ndarray
+        log10(S)
+    y : np.ndarray
+        log10(N)
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (6,), see FIELDS
+    '''
+    result = np.zeros(len(FIELDS))
+    if x.size == 0:
+        return result
+    rows = np.empty((3, x.size))
+    rows[0] = 1
+    np.subtract(x, x[0], out=rows[1])
+    np.subtract(y, y[0], out=rows[2])
+    sums = np.dot(rows, rows.T)
+    n = sums[0, 0]
+    mean_dx = sums[0, 1] / n
+    mean_dy = sums[0, 2] / n
+    result[N] = n
+    result[MEAN_X] = x[0] + mean_dx
+    result[MEAN_Y] = y[0] + mean_dy
+    result[SXX] = max(sums[1, 1] - (sums[0, 1] * mean_dx), 0)
+    result[SYY] = max(sums[2, 2] - (sums[0, 2] * mean_dy), 0)
+    result[SXY] = sums[1, 2] - (sums[0, 1] * mean_dy)
+    return result
+
+
+
+def segment_moments(x, y, offsets):
+    '''Calculate the moments of many data sets at once, given as segments of
+    concatenated arrays. As moments(), each segment is shifted by its first
+    point, and all of the sums are found in one pass with np.add.reduceat
+
+    Parameters
+    ----------
+    x : np.ndarray
+        log10(S) of all data sets, concatenated
+    y : np.ndarray
+        log10(N) of all data sets, concatenated
+    offsets : np.ndarray
+        Boundaries of the segments, of length (number of segments + 1):
+        segment i is x[offsets[i]:offsets[i+1]]
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (number of segments, 6), see FIELDS. Empty segments
+        have all moments zero
+    '''
+    offsets = np.asarray(offsets, dtype=np.intp)
+    counts = np.diff(offsets)
+    result = np.zeros((counts.size, len(FIELDS)))
+    filled = counts > 0
+    if not filled.any():
+        return result
+    # reduceat cannot handle empty segments. Skipping them is enough, since an
+    # empty segment starts where the next segment starts
+    starts = offsets[:-1][filled]
+    n = counts[filled].astype(np.float64)
+    dx = x[offsets[0]:offsets[-1]] - np.repeat(x[starts], counts[filled])
+    dy = y[offsets[0]:offsets[-1]] - np.repeat(y[starts], counts[filled])
+    rows = np.stack([dx, dy, dx*dx, dy*dy, dx*dy])
+    sum_dx, sum_dy, sum_dx2, sum_dy2, sum_dxdy = np.add.reduceat(rows, starts - offsets[0], axis=1)
+    mean_dx = sum_dx / n
+    mean_dy = sum_dy / n
+    result[filled, N] = n
+    result[filled, MEAN_X] = x[starts] + mean_dx
+    result[filled, MEAN_Y] = y[starts] + mean_dy
+    result[filled, SXX] = np.maximum(sum_dx2 - (sum_dx * mean_dx), 0)
+    result[filled, SYY] = np.maximum(sum_dy2 - (sum_dy * mean_dy), 0)
+    result[filled, SXY] = sum_dxdy - (sum_dx * mean_dy)
+    return result
+
+
+
+def weighted_moments(x, y, weights):
+    '''Calculate the moments of many weighted copies of the same data at once,
+    for example bootstrap resamples, where the weights count how many times
+    each point was drawn. As moments(), the data is shifted by its first point,
+    and all of the sums are found as one matrix product
+
+    Parameters
+    ----------
+    x : np.ndarray
+        log10(S)
+    y : np.ndarray
+        log10(N)
+    weights : np.ndarray
+        Array of shape (..., len(x)), the weight of each point in each copy
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape weights.shape[:-1] + (6,), see FIELDS
+    '''
+    result = np.zeros(weights.shape[:-1] + (len(FIELDS),))
+    if x.size == 0:
+        return result
+    dx = x - x[0]
+    dy = y - y[0]
+    rows = np.stack([np.ones(x.size), dx, dy, dx*dx, dy*dy, dx*dy], axis=1)
+    n, sum_dx, sum_dy, sum_dx2, sum_dy2, sum_dxdy = np.moveaxis(np.dot(weights, rows), -1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dx = sum_dx / n
+        mean_dy = sum_dy / n
+    result[..., N] = n
+    result[..., MEAN_X] = x[0] + mean_dx
+    result[..., MEAN_Y] = y[0] + mean_dy
+    result[..., SXX] = np.maximum(sum_dx2 - (sum_dx * mean_dx), 0)
+    result[..., SYY] = np.maximum(sum_dy2 - (sum_dy * mean_dy), 0)
+    result[..., SXY] = sum_dxdy - (sum_dx * mean_dy)
+    return result
+
+
+
+def prefix_moments(x, y):
+    '''Calculate the moments of every leading part of the data: row k is the
+    moments of x[:k+1], y[:k+1]. As moments(), the data is shifted by its first
+    point, and the sums are found for every k at once as cumulative sums
+
+    Parameters
+    ----------
+    x : np.ndarray
+        log10(S)
+    y : np.ndarray
+        log10(N)
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (len(x), 6), see FIELDS
+    '''
+    result = np.zeros((x.size, len(FIELDS)))
+    if x.size == 0:
+        return result
+    dx = x - x[0]
+    dy = y - y[0]
+    rows = np.stack([dx, dy, dx*dx, dy*dy, dx*dy])
+    sum_dx, sum_dy, sum_dx2, sum_dy2, sum_dxdy = np.cumsum(rows, axis=1)
+    n = np.arange(1, x.size+1, dtype=np.float64)
+    mean_dx = sum_dx / n
+    mean_dy = sum_dy / n
+    result[:, N] = n
+    result[:, MEAN_X] = x[0] + mean_dx
+    result[:, MEAN_Y] = y[0] + mean_dy
+    result[:, SXX] = np.maximum(sum_dx2 - (sum_dx * mean_dx), 0)
+    result[:, SYY] = np.maximum(sum_dy2 - (sum_dy * mean_dy), 0)
+    result[:, SXY] = sum_dxdy - (sum_dx * mean_dy)
+    return result
+
+
+
+def data_moments(data, runout, log_data=None):
+    '''Calculate the moments of the failures and runouts of an S-N data set
+
+    Parameters
+    ----------
+    data : np.ndarray
+        S is data[:, 0], N is data[:, 1]
+    runout : np.ndarray
+        True where that row is a runout
+    log_data : np.ndarray, optional
+        np.log10(data), if already calculated
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (2, 6). [0] are the moments of the failures, [1] of the
+        runouts
+    '''
+    if log_data is None:
+        log_data = np.log10(data)
+    return np.stack([moments(log_data[mask, 0], log_data[mask, 1])
+                     for mask in (~runout, runout)])
+
+
+
+def combine(a, b):
+    '''Combine two sets of moments into the moments of the union of the data
+    (Chan, Golub & LeVeque, 1979). Either argument may be an array of moments,
+    in which case normal broadcasting rules apply'''
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n = a[..., N] + b[..., N]
+    weight = np.divide(b[..., N], n, out=np.zeros(np.shape(n)), where=n > 0)
+    dx = b[..., MEAN_X] - a[..., MEAN_X]
+    dy = b[..., MEAN_Y] - a[..., MEAN_Y]
+    cross = a[..., N] * weight
+    result = np.empty(np.broadcast(a, b).shape)
+    result[..., N] = n
+    result[..., MEAN_X] = a[..., MEAN_X] + (dx * weight)
+    result[..., MEAN_Y] = a[..., MEAN_Y] + (dy * weight)
+    result[..., SXX] = a[..., SXX] + b[..., SXX] + (dx * dx * cross)
+    result[..., SYY] = a[..., SYY] + b[..., SYY] + (dy * dy * cross)
+    result[..., SXY] = a[..., SXY] + b[..., SXY] + (dx * dy * cross)
+    return result
+
+
+
+def subtract(a, b):
+    '''The inverse of combine(): the moments of the data described by a, once
+    the data described by b has been removed from it. b must be a subset of
+    the data of a'''
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n = a[..., N] - b[..., N]
+    result = np.zeros(np.broadcast(a, b).shape)
+    remaining = n > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = ((a[..., N] * a[..., MEAN_X]) - (b[..., N] * b[..., MEAN_X])) / n
+        mean_y = ((a[..., N] * a[..., MEAN_Y]) - (b[..., N] * b[..., MEAN_Y])) / n
+        cross = n * b[..., N] / a[..., N]
+    dx = b[..., MEAN_X] - mean_x
+    dy = b[..., MEAN_Y] - mean_y
+    result[..., N] = n
+    result[..., MEAN_X] = mean_x
+    result[..., MEAN_Y] = mean_y
+    result[..., SXX] = np.maximum(a[..., SXX] - b[..., SXX] - (dx * dx * cross), 0)
+    result[..., SYY] = np.maximum(a[..., SYY] - b[..., SYY] - (dy * dy * cross), 0)
+    result[..., SXY] = a[..., SXY] - b[..., SXY] - (dx * dy * cross)
+    # Removing all of the data leaves nothing
+    result[np.invert(remaining)] = 0
+    return result
+
+
+
+def power_sums(m):
+    '''Convert moments into the plain sums
+    n, sum(x), sum(y), sum(x**2), sum(y**2), sum(x*y)'''
+    m = np.asarray(m)
+    n = m[..., N]
+    sum_x = n * m[..., MEAN_X]
+    sum_y = n * m[..., MEAN_Y]
+    sum_x2 = m[..., SXX] + (sum_x * m[..., MEAN_X])
+    sum_y2 = m[..., SYY] + (sum_y * m[..., MEAN_Y])
+    sum_xy = m[..., SXY] + (sum_x * m[..., MEAN_Y])
+    return n, sum_x, sum_y, sum_x2, sum_y2, sum_xy
+
+
+
+def residual_sum_of_squares(m, alpha, beta):
+    '''Sum of squared residuals, sum((y - alpha - beta*x)**2), of the data
+    described by moments m about any line y = alpha + beta*x. Arguments are
+    broadcast together'''
+    m = np.asarray(m, dtype=np.float64)
+    offset = m[..., MEAN_Y] - alpha - (beta * m[..., MEAN_X])
+    return (m[..., SYY] - (2 * beta * m[..., SXY]) + (beta * beta * m[..., SXX])
+            + (m[..., N] * offset * offset))
+
+
+
+def fit(m, slope=None, intercept=None):
+    '''Least-squares fit of the model y = alpha + beta*x from moments
+
+    The three cases match those of EdnaCalc.linear_regression:
+        2 DOF : fit both alpha and beta
+        1 DOF : beta is fixed (slope given), fit alpha
+        0 DOF : both fixed (slope and intercept given), nothing is fitted
+
+    Parameters
+    ----------
+    m : np.ndarray
+        Moments, shape (..., 6)
+    slope : float, optional
+        Fixed value of beta
+    intercept : float, optional
+        Fixed value of alpha, i.e. log10 of the intercept. Only used together
+        with slope
+
+    Returns
+    -------
+    dict
+        alpha, beta, points, dof, residual_sum_of_squares,
+        total_sum_of_squares, variance, r_squared, and the parameter
+        covariance as var_alpha, var_beta, cov_alpha_beta. Each value has the
+        shape of m[..., 0]
+    '''
+    m = np.asarray(m, dtype=np.float64)
+    n = m[..., N]
+    mean_x = m[..., MEAN_X]
+    mean_y = m[..., MEAN_Y]
+    sxx = m[..., SXX]
+    syy = m[..., SYY]
+    sxy = m[..., SXY]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if slope is None:
+            dof = 2
+            beta = sxy / sxx
+            alpha = mean_y - (beta * mean_x)
+            rss = np.maximum(syy - (beta * sxy), 0)
+        else:
+            beta = np.full(n.shape, slope, dtype=np.float64)
+            rss = syy - (2 * beta * sxy) + (beta * beta * sxx)
+            if intercept is None:
+                dof = 1
+                alpha = mean_y - (beta * mean_x)
+            else:
+                dof = 0
+                alpha = np.full(n.shape, intercept, dtype=np.float64)
+                rss = rss + (n * np.square(mean_y - alpha - (beta * mean_x)))
+            rss = np.maximum(rss, 0)
+        variance = rss / (n - dof)
+        if dof == 2:
+            var_beta = variance / sxx
+            var_alpha = variance * ((1 / n) + (mean_x * mean_x / sxx))
+            cov_alpha_beta = -mean_x * var_beta
+        elif dof == 1:
+            var_beta = np.zeros(n.shape)
+            var_alpha = variance / n
+            cov_alpha_beta = np.zeros(n.shape)
+        else:
+            var_beta = np.zeros(n.shape)
+            var_alpha = np.zeros(n.shape)
+            cov_alpha_beta = np.zeros(n.shape)
+        r_squared = 1 - (rss / syy)
+    return {"alpha": alpha, "beta": beta, "points": n, "dof": dof,
+            "residual_sum_of_squares": rss, "total_sum_of_squares": syy,
+            "variance": variance, "r_squared": r_squared,
+            "var_alpha": var_alpha, "var_beta": var_beta,
+            "cov_alpha_beta": cov_alpha_beta}
+
+
+
+def singletons(m):
+    '''Describe each data set as a group with a single member
+
+    Parameters
+    ----------
+    m : np.ndarray
+        Moments, shape (..., 6)
+
+    Returns
+    -------
+    np.ndarray
+        Group statistics, shape (..., len(GROUP_FIELDS))
+    '''
+    m = np.asarray(m, dtype=np.float64)
+    g = np.empty(m.shape[:-1] + (len(GROUP_FIELDS), ))
+    g[..., :len(FIELDS)] = m
+    g[..., MEMBERS] = 1
+    g[..., WITHIN_SXX] = m[..., SXX]
+    g[..., WITHIN_SYY] = m[..., SYY]
+    g[..., WITHIN_SXY] = m[..., SXY]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rss = np.maximum(m[..., SYY] - (m[..., SXY]**2 / m[..., SXX]), 0)
+        dof = m[..., N] - 2
+        g[..., RSS_SEPARATE] = rss
+        g[..., DOF_LOG_VARIANCE] = dof * np.log(rss / dof)
+        g[..., INVERSE_DOF] = 1 / dof
+    return g
+
+
+
+def merge_groups(a, b):
+    '''Statistics of the union of two groups of data sets. As for combine(),
+    normal broadcasting rules apply'''
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    result = a + b
+    result[..., :len(FIELDS)] = combine(a[..., :len(FIELDS)], b[..., :len(FIELDS)])
+    return result
+
+
+
+def group(m):
+    '''Statistics of the group made of k data sets, given their moments with
+    shape (..., k, 6)'''
+    g = singletons(m)
+    result = np.sum(g, axis=-2)
+    # The moments of the union are the pooled sums about each mean, plus the
+    # spread of the means
+    n = result[..., N]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[..., MEAN_X] = np.sum(g[..., N] * g[..., MEAN_X], axis=-1) / n
+        result[..., MEAN_Y] = np.sum(g[..., N] * g[..., MEAN_Y], axis=-1) / n
+    dx = g[..., MEAN_X] - result[..., np.newaxis, MEAN_X]
+    dy = g[..., MEAN_Y] - result[..., np.newaxis, MEAN_Y]
+    result[..., SXX] += np.sum(g[..., N] * dx * dx, axis=-1)
+    result[..., SYY] += np.sum(g[..., N] * dy * dy, axis=-1)
+    result[..., SXY] += np.sum(g[..., N] * dx * dy, axis=-1)
+    return result
+
+
+
+def group_fits(g):
+    '''Fit the members of groups of data sets with three nested models, as
+    used to test whether the members can be pooled (an analysis of covariance):
+        separate : each data set has its own slope and intercept
+        parallel : all data sets share a slope, with their own intercepts
+        coincident : all data sets share both slope and intercept
+
+    Parameters
+    ----------
+    g : np.ndarray
+        Group statistics, shape (..., len(GROUP_FIELDS))
+
+    Returns
+    -------
+    dict
+        rss_separate, rss_parallel, rss_coincident : residual sums of squares
+        dof_separate, dof_parallel, dof_coincident : their degrees of freedom
+        common_slope : slope of the parallel model
+        members : number of data sets in each group
+    '''
+    g = np.asarray(g, dtype=np.float64)
+    n = g[..., N]
+    k = g[..., MEMBERS]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Parallel lines: the sums about each data set's own mean are pooled
+        common_slope = g[..., WITHIN_SXY] / g[..., WITHIN_SXX]
+        rss_parallel = np.maximum(g[..., WITHIN_SYY] - (common_slope * g[..., WITHIN_SXY]), 0)
+    # Coincident lines: a single fit to the union of the data
+    rss_coincident = fit(g[..., :len(FIELDS)])["residual_sum_of_squares"]
+    return {"rss_separate": g[..., RSS_SEPARATE], "rss_parallel": rss_parallel,
+            "rss_coincident": rss_coincident, "dof_separate": n - (2 * k),
+            "dof_parallel": n - k - 1, "dof_coincident": n - 2,
+            "common_slope": common_slope, "members": k}
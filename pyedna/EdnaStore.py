@@ -0,0 +1,298 @@
+'''
+Storage for any number of S-N datasets
+
+All datasets share a single contiguous buffer, laid out as a struct of arrays
+(one row of the buffer per column of data), with each dataset occupying a
+segment of the buffer given by its offsets. Alongside S and N, the buffer holds
+log10(S) and log10(N), calculated once when the data is stored, since all of the
+analysis is done in log space. The data of a single dataset, or of
+several datasets that lie next to each other in the buffer, is returned as a
+view, without copying. Other selections are gathered once, and then cached
+until one of the datasets involved changes.
+'''
+import numpy as np
+
+# Rows of the buffer
+S_COL, N_COL, LOG_S_COL, LOG_N_COL = 0, 1, 2, 3
+NUM_COLUMNS = 4
+
+# Initial buffer capacity, in data points
+MIN_CAPACITY = 1024
+
+
+class DataStore(object):
+    '''Contiguous storage for S-N datasets, identified by arbitrary keys
+    (EdnaCalc uses integers, 0, 1, 2...)
+
+    For each dataset, the store keeps the data, the runout mask, the header
+    lines, and the moments (see EdnaStats). Datasets loaded in streaming mode
+    have only a header and moments.
+
+    Every change to a dataset increases its version number, which callers can
+    use to tell whether anything derived from the dataset is out of date.
+    '''
+    def __init__(self):
+        self._values = np.empty((NUM_COLUMNS, MIN_CAPACITY))
+        self._runout = np.empty(MIN_CAPACITY, dtype=bool)
+        self._size = 0          # Used length of the buffer, including dead space
+        self._live = 0          # Number of points belonging to datasets
+        self.segments = {}      # key : (start, stop) in the buffer
+        self.header = {}
+        self.moments = {}
+        self.version = {}
+        self._versions = 0
+        self._cache = {}
+        return None
+
+
+
+    def __contains__(self, key):
+        return key in self.header
+
+    def __len__(self):
+        return len(self.header)
+
+    def keys(self):
+        '''Keys of all datasets, in the order they were first added'''
+        return list(self.header.keys())
+
+    def is_streamed(self, key):
+        '''True if only the moments of the dataset are available'''
+        return key in self.header and key not in self.segments
+
+
+
+    def set(self, key, data, runout, header, moments, log_data=None):
+        '''Add a dataset, or replace an existing one
+
+        Parameters
+        ----------
+        key : hashable
+            Identifier of the dataset
+        data : np.ndarray or None
+            S is data[:, 0], N is data[:, 1]. None for a streamed dataset
+        runout : np.ndarray or None
+            1D boolean array, True where that row is a runout
+        header : list
+            Header lines of the data file
+        moments : np.ndarray
+            Array of shape (2, 6), see EdnaStats.data_moments
+        log_data : np.ndarray, optional
+            np.log10(data), if already calculated
+        '''
+        self._discard(key)
+        if data is not None:
+            num_points = data.shape[0]
+            start = self._allocate(num_points)
+            self._values[S_COL, start:start+num_points] = data[:, 0]
+            self._values[N_COL, start:start+num_points] = data[:, 1]
+            if log_data is None:
+                log_data = np.log10(data)
+            self._values[LOG_S_COL, start:start+num_points] = log_data[:, 0]
+            self._values[LOG_N_COL, start:start+num_points] = log_data[:, 1]
+            self._runout[start:start+num_points] = runout
+            self.segments[key] = (start, start+num_points)
+            self._live += num_points
+        self.header[key] = header
+        self.moments[key] = moments
+        self._touch(key)
+        return None
+
+
+
+    def remove(self, key):
+        '''Remove a dataset from the store'''
+        self._discard(key)
+        self.header.pop(key, None)
+        self.moments.pop(key, None)
+        self.version.pop(key, None)
+        self._cache.clear()
+        return None
+
+
+
+    def append(self, key, data, runout, moments, log_data=None):
+        '''Add points to the end of an existing dataset
+
+        If the dataset is at the end of the buffer, the points are written
+        in place. Otherwise the dataset is first moved to the end of the
+        buffer, so that later appends are in place
+
+        Parameters
+        ----------
+        key : hashable
+            Identifier of the dataset
+        data : np.ndarray
+            New points, S is data[:, 0], N is data[:, 1]
+        runout : np.ndarray
+            1D boolean array, True where that row is a runout
+        moments : np.ndarray
+            The moments of the whole dataset, including the new points
+        log_data : np.ndarray, optional
+            np.log10(data), if already calculated
+        '''
+        if key in self.segments:
+            num_points = data.shape[0]
+            start, stop = self.segments[key]
+            if stop != self._size or stop + num_points > self._values.shape[1]:
+                start, stop = self._move_to_end(key, num_points)
+            if log_data is None:
+                log_data = np.log10(data)
+            self._values[S_COL, stop:stop+num_points] = data[:, 0]
+            self._values[N_COL, stop:stop+num_points] = data[:, 1]
+            self._values[LOG_S_COL, stop:stop+num_points] = log_data[:, 0]
+            self._values[LOG_N_COL, stop:stop+num_points] = log_data[:, 1]
+            self._runout[stop:stop+num_points] = runout
+            self.segments[key] = (start, stop+num_points)
+            self._size = stop + num_points
+            self._live += num_points
+        self.moments[key] = moments
+        self._touch(key)
+        return None
+
+
+
+    def remove_row(self, key, index, moments):
+        '''Remove a single point from a dataset
+
+        The remaining points are copied to the end of the buffer, rather than
+        shifted in place, so that views previously handed out remain valid
+
+        Parameters
+        ----------
+        key : hashable
+            Identifier of the dataset
+        index : int
+            Row of the dataset to remove
+        moments : np.ndarray
+            The moments of the dataset without the point
+        '''
+        start, stop = self.segments[key]
+        keep = np.delete(np.arange(start, stop), index)
+        values = self._values[:, keep]
+        runout = self._runout[keep]
+        self._discard(key)
+        new_start = self._allocate(keep.size)
+        self._values[:, new_start:new_start+keep.size] = values
+        self._runout[new_start:new_start+keep.size] = runout
+        self.segments[key] = (new_start, new_start+keep.size)
+        self._live += keep.size
+        self.moments[key] = moments
+        self._touch(key)
+        return None
+
+
+
+    def row(self, key, index):
+        '''S, N, runout of a single point of a dataset'''
+        start, stop = self.segments[key]
+        position = np.arange(start, stop)[index]
+        return self._values[S_COL, position], self._values[N_COL, position], bool(self._runout[position])
+
+
+
+    def select(self, keys, log=False):
+        '''Get the (merged) data of one or more datasets
+
+        Parameters
+        ----------
+        keys : list
+            Datasets to select, in order. None of them may be streamed
+        log : bool
+            Return log10(S), log10(N) instead of S, N. Default False
+
+        Returns
+        -------
+        filtered_data : np.ndarray
+            The selected data with all runouts removed
+        data : np.ndarray
+            The selected data
+        runout : np.ndarray
+            Runout mask for data
+
+        All three arrays are read-only: they may be views of the store, or
+        shared with other callers, and changing them would bypass the version
+        of the dataset (and so any results cached from it)
+        '''
+        keys = tuple(keys)
+        cache_key = (keys, log, tuple(self.version[key] for key in keys))
+        if cache_key not in self._cache:
+            bounds = [self.segments[key] for key in keys]
+            if all(bounds[i][1] == bounds[i+1][0] for i in range(len(bounds)-1)):
+                # Adjacent segments: a slice of the buffer is a view
+                selection = slice(bounds[0][0], bounds[-1][1])
+            else:
+                selection = np.concatenate([np.arange(*b) for b in bounds])
+            columns = slice(LOG_S_COL, LOG_N_COL+1) if log else slice(S_COL, N_COL+1)
+            data = self._values[columns, selection].T
+            runout = self._runout[selection]
+            filtered_data = data[np.invert(runout)]
+            for array in (filtered_data, data, runout):
+                array.setflags(write=False)
+            self._cache[cache_key] = (filtered_data, data, runout)
+        return self._cache[cache_key]
+
+
+
+    def _touch(self, key):
+        '''Mark a dataset as changed'''
+        self._versions += 1
+        self.version[key] = self._versions
+        # Anything cached refers to an old version: drop it to free the memory
+        self._cache.clear()
+        return None
+
+
+
+    def _discard(self, key):
+        '''Release the buffer space used by a dataset'''
+        if key in self.segments:
+            start, stop = self.segments.pop(key)
+            self._live -= stop - start
+        return None
+
+
+
+    def _move_to_end(self, key, extra):
+        '''Copy a dataset to the end of the buffer, with room for a further
+        extra points after it. Returns the new (start, stop)'''
+        start, stop = self.segments[key]
+        values = self._values[:, start:stop]
+        runout = self._runout[start:stop]
+        self._discard(key)
+        # Allocating the extra points as well means that they are guaranteed
+        # to fit; they are handed back straight away, for the caller to fill
+        new_start = self._allocate((stop - start) + extra)
+        self._size -= extra
+        self._values[:, new_start:new_start+(stop-start)] = values
+        self._runout[new_start:new_start+(stop-start)] = runout
+        self.segments[key] = (new_start, new_start+(stop-start))
+        self._live += stop - start
+        return self.segments[key]
+
+
+
+    def _allocate(self, num_points):
+        '''Reserve num_points at the end of the buffer, returning the start.
+        If the buffer is full, the live datasets are copied into a new buffer
+        of twice the size required, which also drops the space left by
+        replaced datasets. The old buffer is never overwritten, so that views
+        previously handed out remain valid'''
+        if self._size + num_points > self._values.shape[1]:
+            capacity = max(MIN_CAPACITY, 2 * (self._live + num_points))
+            values = np.empty((NUM_COLUMNS, capacity))
+            runout = np.empty(capacity, dtype=bool)
+            position = 0
+            for key, (start, stop) in sorted(self.segments.items(), key=lambda item: item[1]):
+                length = stop - start
+                values[:, position:position+length] = self._values[:, start:stop]
+                runout[position:position+length] = self._runout[start:stop]
+                self.segments[key] = (position, position+length)
+                position += length
+            self._values = values
+            self._runout = runout
+            self._size = position
+            self._cache.clear()
+        start = self._size
+        self._size += num_points
+        return start
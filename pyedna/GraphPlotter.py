@@ -12,6 +12,11 @@ from matplotlib.backends.backend_tkagg import (
 from matplotlib.backend_bases import key_press_handler
 from matplotlib.figure import Figure
 
+try:
+    from EdnaDesignCurves import DESIGN_CURVES
+except ModuleNotFoundError:
+    from .EdnaDesignCurves import DESIGN_CURVES
+
 
 
 
@@ -76,6 +81,7 @@ class GraphWindow(tk.Toplevel):
     def init_values(self):
         '''Initialise the values that the various buttoms will rely on'''
         self.busy_starting = True # Used to prevent callbacks until everything is initialised
+        self.plotted = False # Set once the user has plotted a curve, see replot()
         
         self.plot_points = tk.BooleanVar()
         self.plot_points.set(True)
@@ -83,8 +89,8 @@ class GraphWindow(tk.Toplevel):
         self.plot_regression.set(True)
         self.plot_conf_pt = tk.BooleanVar()
         self.plot_conf_reg = tk.BooleanVar()
-        self.plot_dc_bs540 = tk.BooleanVar()
-        self.plot_dc_ec3 = tk.BooleanVar()
+        # One per design code, see EdnaDesignCurves
+        self.plot_dc = {code: tk.BooleanVar() for code in DESIGN_CURVES}
         
         self.grid_major = tk.BooleanVar()
         self.grid_minor = tk.BooleanVar()
@@ -165,8 +171,8 @@ class GraphWindow(tk.Toplevel):
         self.bt_plot_regres = tk.Checkbutton(self.frame_what, text="Regression line", variable=self.plot_regression)
         self.bt_plot_points_conf = tk.Checkbutton(self.frame_what, text="95% conf. for reg. line", variable=self.plot_conf_reg)
         self.bt_plot_regres_conf = tk.Checkbutton(self.frame_what, text="95% conf. for given value of S", variable=self.plot_conf_pt)
-        self.bt_dc_bs540 = tk.Checkbutton(self.frame_what, text="95% Surv, 97.5% Conf (BS540, NS3472)", variable=self.plot_dc_bs540)
-        self.bt_dc_ec3   = tk.Checkbutton(self.frame_what, text="95% Surv, 75% Conf (EC3)", variable=self.plot_dc_ec3)
+        self.bt_dc = {code: tk.Checkbutton(self.frame_what, text=curve["description"], variable=self.plot_dc[code])
+                      for code, curve in DESIGN_CURVES.items()}
         
         self.what_title.grid(row=0, sticky="nsew")
         
@@ -177,8 +183,8 @@ class GraphWindow(tk.Toplevel):
         
         self.what_subtitle.grid(row=5, sticky="nsew")
         
-        self.bt_dc_bs540.grid(row=6, sticky="nsw")
-        self.bt_dc_ec3.grid(row=7, sticky="nsw")
+        for i, button in enumerate(self.bt_dc.values()):
+            button.grid(row=6+i, sticky="nsw")
         return None
     
     
@@ -318,7 +324,7 @@ class GraphWindow(tk.Toplevel):
         Where auto ranges are required, we have to get the range of data that will be plotted'''
         # TODO: SHould this happen over in EdnaCalc? The thing is that it is also UI related, including the numbers that should appear
         if self.parent:
-            data = self.parent.calc.data[self.parent.selected_data] # TODO This will currently ignore merging, probably want a method in ednacalc to provide the relevant data
+            data = self.parent.calc.get_data(self.parent.selected_data)[1]
         else: #DEBUGGING PURPOSES ONLY
             data = np.arange(10).reshape(5,2)
         actual_data_range_limit = np.array(( np.min(data[:,1]), np.max(data[:,1]), np.min(data[:,0]), np.max(data[:,0]) ))
@@ -391,8 +397,7 @@ class GraphWindow(tk.Toplevel):
                   "plot_regression" : self.plot_regression.get(),
                   "plot_points_conf" : self.plot_conf_pt.get(),
                   "plot_regression_conf": self.plot_conf_reg.get(),
-                  "plot_dc_bs540" : self.plot_dc_bs540.get(),
-                  "plot_dc_ec3" : self.plot_dc_ec3.get(),
+                  "design_curves" : [code for code, var in self.plot_dc.items() if var.get()],
                   "font": self.font_size.get(),
                   "fig" : self.fig,
                   "ax" : self.ax,
@@ -405,6 +410,7 @@ class GraphWindow(tk.Toplevel):
                 # Round to a nice number
                 self.limit_vars[i].set(int(new_limits[i]))
             self.refresh_graph()
+            self.plotted = True
         else:
             # This should only be used for debugging purposes, where the graph_plotter
             # is initialised without a parent window
@@ -431,6 +437,24 @@ class GraphWindow(tk.Toplevel):
             limits = ((self.n_min.get(), self.n_max.get()), (self.s_min.get(), self.s_max.get()))
         return limits
     
+    def replot(self):
+        '''Plot the curve again with the same settings, if the user has 
+        already plotted it, e.g. after the data has changed in live mode'''
+        try:
+            if self.plotted and self.root.winfo_exists():
+                # Only the data of the points and lines changes, if possible
+                new_limits = self.parent.calc.update_plot(self.ax, self.parent.selected_data)
+                if new_limits is None:
+                    self.plot_curve()
+                else:
+                    for i in range(4):
+                        self.limit_vars[i].set(int(new_limits[i]))
+                    self.graph.draw_idle()
+        except tk.TclError:
+            # The window has been closed
+            pass
+        return None
+    
     def refresh_graph(self, *args, **kwargs):
         self.fig.tight_layout()
         self.graph.draw()
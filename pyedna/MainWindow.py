@@ -7,6 +7,7 @@ Created on Thu Jun  6 09:58:26 2019
 
 import tkinter as tk
 import tkinter.filedialog as filedialog
+import tkinter.messagebox as messagebox
 import os
 import pathlib
 
@@ -16,6 +17,8 @@ PAD_X = 5
 PAD_Y = 5
 SUFFIX = 'sn'
 TITLE = "PyEdna"
+PARSE_CACHE = False # True to keep a binary cache next to each data file when it is loaded, see EdnaReader
+POLL_INTERVAL = 250 # How often to check files being followed live, in ms
 
 
 class MainWindow(object):
@@ -24,6 +27,7 @@ class MainWindow(object):
         self.init_values()
         self.init_ui_elements()
         self.chkst_button()
+        self.root.after(POLL_INTERVAL, self.poll_followed)
         self.root.mainloop()
         
     def init_values(self):
@@ -32,7 +36,9 @@ class MainWindow(object):
         self.have_data1 = False
         self.have_data2 = False
         self.calc = pyedna.EdnaCalc(self)
+        self.catalog = {}
         self.selected_data = None
+        self.live = tk.BooleanVar()
         pass
     
     def init_ui_elements(self):
@@ -67,6 +73,9 @@ class MainWindow(object):
         self.b_merge = tk.Button(self.upper_1, text="Merge", command=self.button_merge, state="disabled", relief="raised")
         self.b_merge.grid(row=40,column=0,columnspan=2, sticky="nsew")
         
+        self.c_live = tk.Checkbutton(self.upper_1, text="Follow file (live)", variable=self.live)
+        self.c_live.grid(row=50,column=0,columnspan=2, sticky="nsw")
+        
         
         self.upper_1.grid_rowconfigure(3, weight=1) # allow this element to grow heightwise
         self.upper_1.grid_columnconfigure(0, weight=1)
@@ -134,14 +143,16 @@ class MainWindow(object):
         pass
     
     def button_load1(self, **kwargs):
-        self.read_test_file(self.lower_data1, 0)
+        if not self.read_test_file(self.lower_data1, 0):
+            return None
         self.have_data1 = True
         self.selected_data = 0
         self.chkst_button()
         pass
     
     def button_load2(self, **kwargs):
-        self.read_test_file(self.lower_data2, 1)
+        if not self.read_test_file(self.lower_data2, 1):
+            return None
         self.have_data2 = True
         self.selected_data = 1
         self.chkst_button()
@@ -151,10 +162,43 @@ class MainWindow(object):
     #####################           Helper functions
     ###########################################################################
     
+    def poll_followed(self):
+        '''Check the files being followed live for new rows, and refresh any
+        results on display if the data has changed. This reschedules itself'''
+        try:
+            try:
+                updated = self.calc.update_followed()
+            except (OSError, ValueError) as e:
+                # e.g. the file has been deleted: stop following everything, 
+                # rather than repeating the warning every time
+                self.calc.followers.clear()
+                messagebox.showwarning(TITLE, f"Stopped following data files:\n\n{e}")
+                updated = []
+            if updated:
+                self.upper_results.refresh()
+        finally:
+            # Keep polling even if refreshing the results failed
+            self.root.after(POLL_INTERVAL, self.poll_followed)
+        pass
+    
     def load_directory(self, **kwargs):
+        '''List the data files in the folder. Only the header of each file is
+        read here: the data is parsed from the file when a set is loaded, so
+        that changes since then are not missed'''
         self.upper_files.delete(0,"end") # Remove previous contents
-        for f in self.folder.glob(f"*.{SUFFIX}"):
-            self.upper_files.insert("end", f.name)
+        self.catalog = {}
+        failed = []
+        for path in sorted(self.folder.glob(f"*.{SUFFIX}")):
+            entry = {"path": path, "name": path.name, "header": None, "error": None}
+            try:
+                entry["header"] = pyedna.EdnaReader.read_header(path)
+            except (OSError, UnicodeDecodeError) as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+                failed.append(f"{path.name}: {entry['error']}")
+            self.catalog[path.name] = entry
+            self.upper_files.insert("end", path.name)
+        if failed:
+            messagebox.showwarning(TITLE, "The following files could not be read:\n\n" + "\n".join(failed))
         pass
 
     
@@ -205,7 +249,8 @@ class MainWindow(object):
    
 
     def read_test_file(self, destination, data_id):
-        '''Based on a selected entry in self.upper_files, load and insert into the requested data box'''
+        '''Based on a selected entry in self.upper_files, load and insert into the requested data box
+        Returns False if the file could not be read'''
         # TODO - this should have some kind of validation of the file, in addition to just reading out the pure text
         # construct the full filepath
         index = self.upper_files.curselection()[0]
@@ -213,7 +258,17 @@ class MainWindow(object):
         file_path = self.folder / file_name
         
         # Read the data file into the calculator: this extracts the actual data as numbers
-        self.calc.load_data(file_path, data_id)
+        # The parse cache is only used if the file is unchanged since it was written
+        # In live mode, the file is re-read, and then followed as it grows
+        self.calc.unfollow(data_id)
+        try:
+            if self.live.get():
+                self.calc.follow(file_path, data_id)
+            else:
+                self.calc.load_data(file_path, data_id, cache=PARSE_CACHE)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            messagebox.showwarning(TITLE, f"{file_name} could not be read:\n\n{e}")
+            return False
         
         # Read the data file into the GUI - note this is ONLY for display, 
         # the text in the GUI is never used for calculations        
@@ -228,7 +283,7 @@ class MainWindow(object):
             for line in f.readlines():
                 line = line.strip()
                 destination.data.insert("end", line)
-        pass
+        return True
         
         
 
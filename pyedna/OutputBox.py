@@ -24,6 +24,9 @@ class OutputBox(object):
         self.frame.grid_columnconfigure(0, weight=1, uniform="a")
         self.frame.grid_columnconfigure(1, weight=1, uniform="a")
         self.frame.grid_rowconfigure(3, weight=1)
+        
+        self.last_output = None     # What is on display in quick_results: "analyse", "compare" or None
+        self.graph_window = None
         return None
         
     def analyse(self, **kwargs):
@@ -35,6 +38,7 @@ class OutputBox(object):
             self.quick_results.delete(0,"end")
             for line in outstr:
                 self.quick_results.insert("end", line)
+            self.last_output = "analyse"
         else:
             tk.messagebox.showwarning("Select data first")
         return None
@@ -48,6 +52,7 @@ class OutputBox(object):
             self.quick_results.delete(0,"end")
             for line in outstr:
                 self.quick_results.insert("end", line)
+            self.last_output = "compare"
         else:
             tk.messagebox.showwarning("Select data first")
         return None
@@ -70,7 +75,18 @@ class OutputBox(object):
         
     def graph(self, **kwargs):
         '''Open the graph plotter window'''
-        pyedna.GraphWindow(self.parent)
+        self.graph_window = pyedna.GraphWindow(self.parent)
+        return None
+    
+    def refresh(self, **kwargs):
+        '''Repeat whatever is on display (quick results, and the graph), 
+        e.g. after the data has changed in live mode'''
+        if self.last_output == "analyse":
+            self.analyse()
+        elif self.last_output == "compare":
+            self.compare()
+        if self.graph_window is not None:
+            self.graph_window.replot()
         return None
     
     def user_slope(self, event, **kwargs):
@@ -8,6 +8,11 @@ from mailmerge import MailMerge # installed as "docx-mailmerge"
 from pathlib import Path
 import locale
 
+try:
+    from EdnaDesignCurves import DEFAULT_CODES
+except ModuleNotFoundError:
+    from .EdnaDesignCurves import DEFAULT_CODES
+
 
 def format_report(report_filename, data, runout, results, *args, **kwargs):
     ''' Format the results of a linear regression analysis into a prepared
@@ -33,6 +38,9 @@ def format_report(report_filename, data, runout, results, *args, **kwargs):
             Defaults to "en_GB": 
                 decimal point is "."
                 thousand separator is ","
+        design_curves : list
+            Codes of the design curves to write, see EdnaDesignCurves.
+            Defaults to EdnaDesignCurves.DEFAULT_CODES
         
     Returns
     -------
@@ -50,6 +58,8 @@ def format_report(report_filename, data, runout, results, *args, **kwargs):
     location = kwargs.get("locale", "en_GB")
     locale.setlocale(locale.LC_ALL, location)
     
+    design_curves = kwargs.get("design_curves", DEFAULT_CODES)
+    
     to_write = {}
     ######### Data file header information
     to_write["header_1"] = results["header_1"]
@@ -86,10 +96,11 @@ def format_report(report_filename, data, runout, results, *args, **kwargs):
     to_write["epsilon"] = "{}".format(int(100*results["confidence_interval"]))
     
     # Output: Design curve
-    to_write["dc_bs540_intercept"] =    f"{results['dc_bs540_intercept']:.4n}"
-    to_write["dc_bs540_delta_sigma"] =  f"{results['dc_bs540_delta_sigma']:.4n}"
-    to_write["dc_ec3_intercept"] =      f"{results['dc_ec3_intercept']:.4n}"
-    to_write["dc_ec3_delta_sigma"] =    f"{results['dc_ec3_delta_sigma']:.4n}"
+    # Each code is written to the merge fields dc_<code>_intercept and 
+    # dc_<code>_delta_sigma, if the template has them
+    for code in design_curves:
+        for field in (f"dc_{code}_intercept", f"dc_{code}_delta_sigma"):
+            to_write[field] = f"{results[field]:.4n}"
 #    
     with MailMerge(template) as document:
 #        fields = document.get_merge_fields()
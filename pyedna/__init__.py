@@ -4,6 +4,8 @@ from pyedna.MainWindow import MainWindow
 from pyedna.GraphPlotter import GraphWindow
 from pyedna.EdnaCalc import EdnaCalc
 from pyedna.EdnaLookup import ddist
+from pyedna.EdnaReader import read_data_file, read_directory
+from pyedna.EdnaRainflow import RainflowCounter, rainflow
 from pyedna.ReportFormatter import format_report
 
 
@@ -11,6 +13,7 @@ def start():
     MainWindow()
 
 __all__ = ['OutputBox', 'InputDisplay', 'MainWindow', 'EdnaCalc',
-           'GraphWindow', "ddist", "format_report"]
+           'GraphWindow', "ddist", "format_report", "read_data_file",
+           "read_directory", "RainflowCounter", "rainflow"]
 
 __version__ = '1.1.0'
\ No newline at end of file